@@ -1,32 +1,33 @@
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import Response
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from models.task import DownloadTask
-from models.task import DownloadTask
-from models.market import MarketDownloadRequest, MarketQueryRequest
+from models.task import DownloadTask, TaskBatchStatusRequest
+from models.market import MarketDownloadRequest, MarketQueryRequest, TABLE_REGISTRY
 from services.market_manager import market_manager
 from services.data import data_manager
-from core.exceptions import DataNotFoundError
+from services.scan_hub import scan_hub
 
 router = APIRouter()
 
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
 # -- Tasks Endpoints --
 
 @router.post("/tasks/download", response_model=DownloadTask)
 async def create_market_download_task(request: MarketDownloadRequest):
     """
     创建/启动行情下载后台任务。
+    分区表默认增量下载：请求月份中在该月结束后写入 (文件 mtime) 的分区视为完整，其中已有的标的跳过；
+    复制或恢复过数据文件时 mtime 不再可靠，请传 force=true 全部重新下载。
     """
-    try:
-        task_id = await market_manager.start_market_download_task(request)
-        task = market_manager.get_task(task_id)
-        if not task:
-             raise HTTPException(status_code=500, detail="Task creation failed")
-        return task
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    task_id = await market_manager.start_market_download_task(request)
+    task = market_manager.get_task(task_id)
+    if not task:
+        raise HTTPException(status_code=500, detail="Task creation failed")
+    return task
 
 @router.get("/tasks/{task_id}", response_model=DownloadTask)
 async def get_task_status(task_id: str):
@@ -38,6 +39,13 @@ async def get_task_status(task_id: str):
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
+@router.post("/tasks/batch-status", response_model=Dict[str, Optional[DownloadTask]])
+async def get_tasks_status(request: TaskBatchStatusRequest):
+    """
+    批量查询任务状态，一次请求返回多个任务，未找到的任务值为 null。
+    """
+    return market_manager.get_tasks(request.ids)
+
 @router.post("/tasks/{task_id}/stop")
 async def stop_task(task_id: str):
     """
@@ -62,8 +70,7 @@ async def get_market_registry():
     """
     获取系统中所有已注册的数据表配置。
     """
-    from models.market import TABLE_REGISTRY
-    return TABLE_REGISTRY
+    return dict(TABLE_REGISTRY)
 
 @router.get("/tables")
 async def get_market_tables():
@@ -73,21 +80,19 @@ async def get_market_tables():
     return data_manager.get_storage_metadata()
 
 @router.post("/query")
-async def query_market_data(request: MarketQueryRequest):
+async def query_market_data(request: MarketQueryRequest, accept: Optional[str] = Header(None)):
     """
     Query multidimensional market data.
+    Accept 为 application/vnd.apache.arrow.stream 时返回连续的 Arrow IPC Stream (每个数据节点一个)，否则返回 JSON。
     """
-    try:
-        # Pydantic validates start_date/end_date as date objects
-        container = data_manager.load_market_data(
-            table_names=request.table_names,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            symbols=request.symbols
-        )
-        return container.to_dict()
-    except DataNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        # Log error in real app
-        raise HTTPException(status_code=500, detail=str(e))
+    # Pydantic validates start_date/end_date as date objects
+    # DataNotFoundError / ValueError 由 main.py 中注册的异常处理器统一映射
+    container = await scan_hub.load_market_data(
+        table_names=request.table_names,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        symbols=request.symbols
+    )
+    if accept and ARROW_STREAM_MEDIA_TYPE in accept:
+        return Response(content=container.to_arrow_ipc(), media_type=ARROW_STREAM_MEDIA_TYPE)
+    return container.to_dict()
@@ -1,4 +1,6 @@
 import os
+import tempfile
+from dataclasses import make_dataclass
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -17,11 +19,16 @@ class Settings(BaseSettings):
     # Logs & Data defaults
     LOGS_DIR: str = os.path.join(REPO_ROOT, "logs")
     DATA_DIR: str = os.path.join(REPO_ROOT, "data")
+    # 查询结果磁盘缓存 (可随时删除)：默认放在系统临时目录，避免写入工作区；可通过 .env 中 CACHE_DIR 覆盖
+    CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "carrotquant", "query_cache")
 
     # App Settings
     DEBUG: bool = True
     HOST: str = "127.0.0.1"
     PORT: int = 8000
+
+    # DuckDB 内存上限 (如 "8GB")，未设置时使用 DuckDB 默认值 (物理内存的 80%)
+    DUCKDB_MEMORY_LIMIT: str | None = None
     
     # Secrets / Tokens
     FRED_API_KEY: str | None = None
@@ -36,4 +43,21 @@ class Settings(BaseSettings):
         extra="ignore"
     )
 
-settings = Settings()
+def _snapshot_settings(source: Settings):
+    """
+    将 Pydantic Settings 快照为 slots dataclass：属性访问为 C 级槽位读取，不经过 Pydantic 机制。
+    路径类配置在此统一转为绝对路径。
+    未设置 frozen：测试中需要临时改写 DATA_DIR。
+    """
+    values = source.model_dump()
+    for name, value in values.items():
+        if name.endswith("_DIR") and isinstance(value, str):
+            values[name] = os.path.abspath(value)
+    snapshot_cls = make_dataclass(
+        "SettingsSnapshot",
+        [(name, field.annotation) for name, field in Settings.model_fields.items()],
+        slots=True,
+    )
+    return snapshot_cls(**values)
+
+settings = _snapshot_settings(Settings())
@@ -1,66 +1,56 @@
-import os
+import functools
 
-def build_pivot_sql(table_name: str, 
-                    parquet_paths: list, 
-                    id_col: str, 
-                    fields: list, 
-                    start_date: str, 
-                    end_date: str, 
-                    symbols: list = None) -> str:
+def build_distinct_symbols_sql(parquet_paths: list, id_col: str, start_year: int, end_year: int) -> tuple:
     """
-    专门拼装 DuckDB 原生 PIVOT 语句，用于高性能矩阵加载
+    拼装标的枚举 SQL，用于在未指定 symbols 时确定矩阵的标的轴
+    返回 (sql, params)：按 hive 分区列 year 裁剪文件。parquet_paths 须为 POSIX 形式路径
     """
-    path_sql = ", ".join([f"'{p}'" for p in parquet_paths])
-    sym_sql_list = ", ".join([f"'{s}'" for s in symbols]) if symbols else "SELECT DISTINCT " + id_col + " FROM read_parquet([" + path_sql + "], hive_partitioning=true)"
-    
-    # 构造聚合表达式 (PIVOT 需要聚合函数)
-    value_exprs = ", ".join([f"FIRST({f}) AS {f}" for f in fields])
-    
-    # EXCLUDE 掉索引列，防止 PIVOT 结果冲突
-    pivot_sql = f"""
-        PIVOT (
-            SELECT CAST(trade_date AS VARCHAR) as t, {id_col} as s, * EXCLUDE(trade_date, {id_col}, year)
-            FROM read_parquet([{path_sql}], hive_partitioning=true)
-            WHERE trade_date >= '{start_date}' AND trade_date <= '{end_date}'
-        ) ON s IN ({sym_sql_list}) USING {value_exprs} GROUP BY t
-        ORDER BY t
+    sql = f"""
+        SELECT DISTINCT {id_col}
+        FROM read_parquet(?::VARCHAR[], hive_partitioning=true, union_by_name=false)
+        WHERE year BETWEEN ? AND ?
+        ORDER BY 1
     """
-    return pivot_sql
+    return sql, [list(parquet_paths), start_year, end_year]
 
-def build_snapshot_query_sql(parquet_path: str, columns: list, filters: dict = None) -> str:
-    """
-    专门拼装快照查询 SQL (无 trade_date 约束)
+@functools.lru_cache(maxsize=64)
+def _long_sql_template(id_col: str, fields: tuple, zerofill_cols: frozenset) -> str:
+    """长表查询模板：仅取决于表结构配置，按 (id_col, fields, zerofill_cols) 缓存"""
+    # 显式列投影：仅读取所需字段的 ColumnChunk
+    field_sql = ", ".join([f"COALESCE({f}, 0) AS {f}" if f in zerofill_cols else f for f in fields])
+    return f"""
+        SELECT trade_date, {id_col}, {field_sql}
+        FROM read_parquet(?::VARCHAR[], hive_partitioning=true, union_by_name=false)
+        WHERE year BETWEEN ? AND ? AND trade_date >= ? AND trade_date <= ? AND list_contains(?::VARCHAR[], {id_col})
     """
-    col_sql = ", ".join(columns)
-    safe_path = parquet_path.replace("\\", "/")
-    
-    where_clause = "1=1"
-    if filters:
-        for k, v in filters.items():
-            if v is None: continue
-            if isinstance(v, list):
-                val_list = ", ".join([f"'{i}'" for i in v])
-                where_clause += f" AND {k} IN ({val_list})"
-            else:
-                where_clause += f" AND {k} = '{v}'"
 
-    return f"""
-        SELECT {col_sql}
-        FROM read_parquet('{safe_path}')
-        WHERE {where_clause}
+def build_long_sql(parquet_paths: list,
+                   id_col: str,
+                   fields: list,
+                   start_date: str,
+                   end_date: str,
+                   symbols: list,
+                   zerofill_cols: list = None) -> tuple:
+    """
+    拼装长表查询 SQL，用于矩阵加载 (矩阵重组在 NumPy 侧以一次散列赋值完成，不在 DuckDB 中 PIVOT)
+    返回 (sql, params)：路径、日期与标的均以 ? 绑定，同一张表的 SQL 文本恒定，模板只拼装一次。
+    日期范围同时换算为 hive 分区列 year 的范围，由 DuckDB 在文件级裁剪。
+    zerofill_cols 中的字段在扫描时即以 COALESCE 补零。
+    parquet_paths 须为 POSIX 形式路径。
     """
+    sql = _long_sql_template(id_col, tuple(fields), frozenset(zerofill_cols or ()))
+    return sql, [list(parquet_paths), int(start_date[:4]), int(end_date[:4]), start_date, end_date, list(symbols)]
 
 def build_metadata_sql(table_path: str, is_timeseries: bool = True) -> str:
     """
     拼装元数据审计 SQL：提取时间范围和行数统计
     is_timeseries=False 时不查询 trade_date（快照表无此列）
+    table_path 须为 POSIX 形式路径，支持单文件或分区目录
     """
-    # 路径处理：兼容 Windows 路径并支持单文件
-    safe_path = table_path.replace("\\", "/")
-    if safe_path.endswith(".parquet"):
-        from_clause = f"read_parquet('{safe_path}')"
+    if table_path.endswith(".parquet"):
+        from_clause = f"read_parquet('{table_path}')"
     else:
-        from_clause = f"read_parquet('{safe_path}/**/*.parquet', hive_partitioning=true)"
+        from_clause = f"read_parquet('{table_path}/**/*.parquet', hive_partitioning=true)"
     
     if is_timeseries:
         date_cols = "MIN(trade_date)::VARCHAR AS start_date, MAX(trade_date)::VARCHAR AS end_date"
@@ -73,49 +63,3 @@ def build_metadata_sql(table_path: str, is_timeseries: bool = True) -> str:
             COUNT(*)::INTEGER as row_count 
         FROM {from_clause}
     """
-
-from models.market import DATA_SCHEMA
-
-def build_save_parquet_sql(source_df_name: str, actual_columns: list, order_by: str, file_path: str) -> str:
-    """
-    专门拼装分区数据(save_month)存储 SQL。
-    包含 year 分区键的处理。
-    """
-    cast_exprs = []
-    for col in actual_columns:
-        if col == "year":
-            cast_exprs.append(f'CAST("year" AS INTEGER) AS "year"')
-            continue
-        if col not in DATA_SCHEMA:
-            raise KeyError(f"字段 '{col}' 未在 DATA_SCHEMA 中注册。")
-        sql_type = DATA_SCHEMA[col]
-        cast_exprs.append(f'CAST("{col}" AS {sql_type}) AS "{col}"')
-
-    safe_path = file_path.replace("\\", "/")
-    return f"""
-        COPY (
-            SELECT {', '.join(cast_exprs)}
-            FROM {source_df_name}
-            ORDER BY {order_by}
-        ) TO '{safe_path}' (FORMAT 'parquet', COMPRESSION 'ZSTD');
-    """
-
-def build_save_table_sql(source_df_name: str, actual_columns: list, order_by: str, file_path: str) -> str:
-    """
-    专门拼装单表快照(save_snapshot)存储 SQL。
-    """
-    cast_exprs = []
-    for col in actual_columns:
-        if col not in DATA_SCHEMA:
-            raise KeyError(f"字段 '{col}' 未在 DATA_SCHEMA 中注册。")
-        sql_type = DATA_SCHEMA[col]
-        cast_exprs.append(f'CAST("{col}" AS {sql_type}) AS "{col}"')
-
-    safe_path = file_path.replace("\\", "/")
-    return f"""
-        COPY (
-            SELECT {', '.join(cast_exprs)}
-            FROM {source_df_name}
-            ORDER BY {order_by}
-        ) TO '{safe_path}' (FORMAT 'parquet', COMPRESSION 'ZSTD');
-    """
@@ -1,12 +1,62 @@
 
 import os
+from calendar import monthrange
+from datetime import date
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
 import pandas as pd
-import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from loguru import logger
 
-from models.market import TABLE_REGISTRY
+from models.market import TABLE_REGISTRY, get_arrow_schema
+
+# Parquet 写入参数：大 Row Group + 低级别 ZSTD，配合排序元数据供读取端按 min/max 裁剪
+PARQUET_WRITE_OPTIONS = {
+    "compression": "zstd",
+    "compression_level": 1,
+    "row_group_size": 256000,
+    "use_dictionary": True,
+    "write_statistics": True,
+}
+
+def to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """
+    按 DATA_SCHEMA 转换为 Arrow Table。
+    源数据类型无法直接转换时 (如混合类型的 object 列) 先原样转换再统一 cast。
+    """
+    schema = get_arrow_schema(df.columns.tolist())
+    try:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False, safe=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.Table.from_pandas(df, preserve_index=False).cast(schema, safe=False)
+
+def _write_sorted_parquet(table: pa.Table, sort_keys: List[str], file_path: Path):
+    """
+    排序后写入 Parquet，并在 footer 中记录 sorting_columns
+    """
+    ordering = [(k, "ascending") for k in sort_keys]
+    table = table.sort_by(ordering)
+    sorting_columns = pq.SortingColumn.from_ordering(table.schema, ordering)
+    pq.write_table(table, file_path, sorting_columns=sorting_columns, **PARQUET_WRITE_OPTIONS)
+
+def to_ipc_buffer(data) -> bytes:
+    """
+    将 DataFrame (按 DATA_SCHEMA 转换) 或已转换的 Arrow Table 序列化为 Arrow IPC 流，用于跨进程传递 (比 pickle DataFrame 更省)
+    """
+    table = data if isinstance(data, pa.Table) else to_arrow_table(data)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def save_month_ipc(root_dir: str, ipc_buffer: bytes, table_name: str, year: int, month: int):
+    """
+    进程池入口：反序列化 Arrow IPC 流并写入月度分区
+    """
+    table = pa.ipc.open_stream(ipc_buffer).read_all()
+    DuckDBStorage(root_dir).save_month_table(table, table_name, year, month)
 
 class DuckDBStorage:
     """
@@ -26,47 +76,73 @@ class DuckDBStorage:
             logger.warning(f"[{table_name}] {year}-{month} 数据为空，跳过保存")
             return
 
+        try:
+            table = to_arrow_table(df)
+        except Exception as e:
+            logger.error(f"保存月度数据失败 [{table_name}] {year}-{month}: {e}")
+            raise e
+        self.save_month_table(table, table_name, year, month)
+
+    def save_month_table(self, table: pa.Table, table_name: str, year: int, month: int):
+        """
+        保存单月全量数据 (输入为已按 DATA_SCHEMA 转换的 Arrow Table)。
+        """
         # 1. 获取实际字段
-        actual_fields = df.columns.tolist()
+        actual_fields = table.column_names
 
         # 2. 构建目标路径 (Hive 分区结构)
-        target_dir = self.root_dir / table_name / f"year={year}"
-        target_dir.mkdir(parents=True, exist_ok=True)
-        file_path = target_dir / f"{year}-{month:02d}.parquet"
+        file_path = self.month_path(table_name, year, month)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
 
-        conn = duckdb.connect()
         try:
-            conn.register('input_df', df)
-            
             # 自动识别排序列
-            order_by = "trade_date"
+            sort_keys = ["trade_date"]
             if "sector_name" in actual_fields:
-                order_by = "trade_date, sector_name"
+                sort_keys.append("sector_name")
             elif "stock_code" in actual_fields:
-                order_by = "trade_date, stock_code"
-
-            # 3. 写入 - 调用中心化构建器
-            from core.sql_builder import build_save_parquet_sql
-            sql = build_save_parquet_sql(
-                source_df_name='input_df', 
-                actual_columns=actual_fields, 
-                order_by=order_by, 
-                file_path=str(file_path)
-            )
-            
-            logger.debug(f"执行存储 SQL (表: {table_name}):\n{sql}")
-
-            if file_path.exists():
-                file_path.unlink()
-                
-            conn.execute(sql)
+                sort_keys.append("stock_code")
+
+            # 3. 写入
+            _write_sorted_parquet(table, sort_keys, file_path)
             logger.info(f"已保存月度数据 [{table_name}]: {file_path}")
 
         except Exception as e:
             logger.error(f"保存月度数据失败 [{table_name}] {year}-{month}: {e}")
             raise e
-        finally:
-            conn.close()
+
+    def month_path(self, table_name: str, year: int, month: int) -> Path:
+        """月度分区文件路径: {root}/{table_name}/year={year}/{year}-{month}.parquet"""
+        return self.root_dir / table_name / f"year={year}" / f"{year}-{month:02d}.parquet"
+
+    def get_symbol_month_coverage(self, table_name: str, id_col: str,
+                                  months: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], frozenset]:
+        """
+        请求月份中已完整落盘的 (year, month) -> 标的集合。仅检查 months 对应的分区文件，开销与请求范围成正比。
+        判定依据为文件 mtime：仅统计在该月结束之后写入的文件 (写入时当月已收盘，数据完整)；月中写入的文件不计入，需重新下载。
+        注意：复制/恢复数据文件会改变 mtime，可能使月中写入的文件被视为完整，此时请使用 force 重新下载。
+        仅读取 id 列 (列投影)，不加载行情字段。
+        """
+        coverage = {}
+        for year, month in months:
+            file_path = self.month_path(table_name, year, month)
+            try:
+                mtime = file_path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            month_end = date(year, month, monthrange(year, month)[1])
+            if date.fromtimestamp(mtime) <= month_end:
+                continue
+            ids = pq.read_table(file_path, columns=[id_col]).column(id_col)
+            coverage[(year, month)] = frozenset(pc.unique(ids).to_pylist())
+        return coverage
+
+    def read_month_table(self, table_name: str, year: int, month: int) -> Optional[pa.Table]:
+        """读取已有的月度分区 (不存在时返回 None)，用于增量下载时与新数据合并"""
+        file_path = self.month_path(table_name, year, month)
+        if not file_path.exists():
+            return None
+        return pq.read_table(file_path)
+
     def save_snapshot(self, df: pd.DataFrame, table_name: str):
         """
         保存全量快照数据 (非分区模式)。
@@ -84,37 +160,19 @@ class DuckDBStorage:
         target_dir.mkdir(parents=True, exist_ok=True)
         file_path = target_dir / f"{table_name}.parquet"
 
-        conn = duckdb.connect()
         try:
-            conn.register('input_df', df)
-            
             # 自动识别排序列
             actual_fields = df.columns.tolist()
-            order_by = actual_fields[0] # 快照表通常按首列(ID列)排序
+            sort_key = actual_fields[0] # 快照表通常按首列(ID列)排序
             if "stock_code" in actual_fields:
-                order_by = "stock_code"
+                sort_key = "stock_code"
             elif "sector_name" in actual_fields:
-                order_by = "sector_name"
-
-            # 3. 写入 - 调用中心化构建器
-            from core.sql_builder import build_save_table_sql
-            sql = build_save_table_sql(
-                source_df_name='input_df', 
-                actual_columns=actual_fields, 
-                order_by=order_by, 
-                file_path=str(file_path)
-            )
-            
-            logger.debug(f"执行快照存储 SQL (表: {table_name}):\n{sql}")
-
-            if file_path.exists():
-                file_path.unlink()
-                
-            conn.execute(sql)
+                sort_key = "sector_name"
+
+            # 3. 写入
+            _write_sorted_parquet(to_arrow_table(df), [sort_key], file_path)
             logger.info(f"已保存全量快照 [{table_name}]: {file_path}")
 
         except Exception as e:
             logger.error(f"保存快照数据失败 [{table_name}]: {e}")
             raise e
-        finally:
-            conn.close()
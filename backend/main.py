@@ -2,7 +2,9 @@ import os
 os.environ["TQDM_DISABLE"] = "1"
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from loguru import logger
 
 from core.config import settings
@@ -10,6 +12,9 @@ from core.logging import setup_logging
 from api.main import api_router
 from services.scheduler import scheduler
 from services.data import data_manager
+from services.market_manager import market_manager
+from services.downloader.session import install_pooled_session
+from core.exceptions import DataNotFoundError
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -19,12 +24,19 @@ async def lifespan(app: FastAPI):
     
     # Initialize services
     data_manager.initialize()
+    # akshare 的 HTTP 请求改走线程级连接池 (仅替换 akshare 模块内的 requests 引用)
+    install_pooled_session()
     scheduler.start()
+    # CPU 密集的 Parquet 压缩写入走独立进程池，保持事件循环响应
+    write_pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+    market_manager.write_pool = write_pool
     
     yield
     
     # Shutdown
     logger.info("Shutting down CarrotQuant Backend...")
+    market_manager.write_pool = None
+    write_pool.shutdown(wait=True)
     scheduler.stop()
 
 app = FastAPI(
@@ -33,6 +45,15 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 统一异常映射：业务异常直接转为对应状态码，未预期异常交由 FastAPI 默认 500 处理
+@app.exception_handler(DataNotFoundError)
+async def data_not_found_handler(request: Request, exc: DataNotFoundError):
+    return JSONResponse(status_code=404, content={"detail": exc.message})
+
+@app.exception_handler(ValueError)
+async def value_error_handler(request: Request, exc: ValueError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -1,8 +1,11 @@
-
+import json
 from datetime import date
-from typing import List, Optional, Dict
+from types import MappingProxyType
+from typing import Annotated, List, Optional, Dict
 import numpy as np
-from pydantic import BaseModel, field_validator
+import pyarrow as pa
+import pyarrow.compute as pc
+from pydantic import BaseModel, Field
 
 class MarketTable:
     """数据表名常量 (SQL 兼容命名: {市场}_{品种}_{来源}_{频率}_{复权})"""
@@ -33,10 +36,43 @@ DATA_SCHEMA = {
     "outstanding_share": "DOUBLE"   # 流通股本 (股)
 }
 
+# DATA_SCHEMA SQL 类型 -> Arrow 类型 (写入前预转换，免去 DuckDB CAST)
+ARROW_TYPE_MAP = {
+    "DATE": pa.date32(),
+    "VARCHAR": pa.string(),
+    "DOUBLE": pa.float64(),
+    "INTEGER": pa.int32(),
+    "BIGINT": pa.int64(),
+    "UBIGINT": pa.uint64(),
+}
+
+def get_arrow_schema(columns: List[str]) -> pa.Schema:
+    """
+    根据 DATA_SCHEMA 为给定列构建 Arrow Schema (year 分区键固定为 INTEGER)
+    """
+    fields = []
+    for col in columns:
+        if col == "year":
+            fields.append(pa.field(col, pa.int32()))
+            continue
+        if col not in DATA_SCHEMA:
+            raise KeyError(f"字段 '{col}' 未在 DATA_SCHEMA 中注册。")
+        fields.append(pa.field(col, ARROW_TYPE_MAP[DATA_SCHEMA[col]]))
+    return pa.schema(fields)
+
+def _freeze(obj):
+    """递归冻结配置：dict -> MappingProxyType，list -> tuple (只读，导入后不再变更)"""
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
 # 全局模型注册表：定义 DuckDB 加载模式、存储类型以及下载配置
 # load_mode: matrix (行情矩阵), mapping (字段映射)
 # storage_type: snapshot (快照), partition (分区)
-TABLE_REGISTRY = {
+# dtype_overrides: 矩阵轨字段的内存精度 (默认 float64)；百分比类有界字段使用 float32，OHLC/成交量保持 float64
+TABLE_REGISTRY = _freeze({
     # --- 分区表 (Partition Tables) ---
     "cn_stock_em_daily_adj": {
         "load_mode": "matrix",
@@ -45,6 +81,7 @@ TABLE_REGISTRY = {
         "fields": ["open", "close", "high", "low", "volume", "amount", "amplitude", "pct_change", "change_amount", "turnover"],
         "ffill_cols": ["open", "close", "high", "low"],
         "zerofill_cols": ["volume", "amount", "turnover"],
+        "dtype_overrides": {"amplitude": "float32", "pct_change": "float32", "change_amount": "float32", "turnover": "float32"},
         "download_config": {"source": "em", "handler": "fetch_stock_daily", "adjust": "adj"}
     },
     "cn_stock_em_daily_raw": {
@@ -54,6 +91,7 @@ TABLE_REGISTRY = {
         "fields": ["open", "close", "high", "low", "volume", "amount", "amplitude", "pct_change", "change_amount", "turnover"],
         "ffill_cols": ["open", "close", "high", "low"],
         "zerofill_cols": ["volume", "amount", "turnover"],
+        "dtype_overrides": {"amplitude": "float32", "pct_change": "float32", "change_amount": "float32", "turnover": "float32"},
         "download_config": {"source": "em", "handler": "fetch_stock_daily", "adjust": "raw"}
     },
     "cn_stock_sina_daily_adj": {
@@ -63,7 +101,8 @@ TABLE_REGISTRY = {
         "fields": ["open", "close", "high", "low", "volume", "amount", "outstanding_share", "turnover"],
         "ffill_cols": ["open", "close", "high", "low"],
         "zerofill_cols": ["volume", "amount", "turnover"],
-        "download_config": {"source": "sina", "handler": "fetch_stock_daily", "adjust": "adj"}
+        "dtype_overrides": {"turnover": "float32"},
+        "download_config": {"source": "sina", "handler": "fetch_stock_daily", "adjust": "adj", "concurrency": 4}
     },
     "cn_stock_sina_daily_raw": {
         "load_mode": "matrix",
@@ -72,7 +111,8 @@ TABLE_REGISTRY = {
         "fields": ["open", "close", "high", "low", "volume", "amount", "outstanding_share", "turnover"],
         "ffill_cols": ["open", "close", "high", "low"],
         "zerofill_cols": ["volume", "amount", "turnover"],
-        "download_config": {"source": "sina", "handler": "fetch_stock_daily", "adjust": "raw"}
+        "dtype_overrides": {"turnover": "float32"},
+        "download_config": {"source": "sina", "handler": "fetch_stock_daily", "adjust": "raw", "concurrency": 4}
     },
     "cn_sector_em_daily_raw": {
         "load_mode": "matrix",
@@ -81,6 +121,7 @@ TABLE_REGISTRY = {
         "fields": ["open", "close", "high", "low", "volume", "amount", "amplitude", "pct_change", "change_amount", "turnover"],
         "ffill_cols": ["open", "close", "high", "low"],
         "zerofill_cols": ["volume", "amount", "turnover"],
+        "dtype_overrides": {"amplitude": "float32", "pct_change": "float32", "change_amount": "float32", "turnover": "float32"},
         "download_config": {"source": "em", "handler": "fetch_sector_daily", "adjust": "raw"}
     },
     "cn_sector_em_daily_adj": {
@@ -90,10 +131,10 @@ TABLE_REGISTRY = {
         "fields": ["open", "close", "high", "low", "volume", "amount", "amplitude", "pct_change", "change_amount", "turnover"],
         "ffill_cols": ["open", "close", "high", "low"],
         "zerofill_cols": ["volume", "amount", "turnover"],
+        "dtype_overrides": {"amplitude": "float32", "pct_change": "float32", "change_amount": "float32", "turnover": "float32"},
         "download_config": {"source": "em", "handler": "fetch_sector_daily", "adjust": "adj"}
     },
     # --- 快照表 (Snapshot Tables): cn_{种类}_{源} ---
-    # --- 快照表 (Snapshot Tables): cn_{种类}_{源} ---
     "cn_stock_em": {
         "load_mode": "mapping",
         "storage_type": "snapshot",
@@ -112,7 +153,25 @@ TABLE_REGISTRY = {
         "fields": ["stock_code", "stock_name", "concept_name"],
         "download_config": {"source": "em", "handler": "fetch_stock_concept_map"}
     }
-}
+})
+
+def _field_actions(config: dict) -> Dict[str, Optional[str]]:
+    """预计算单表字段清洗动作: {field: "zero" | "ffill" | None}"""
+    zerofill = frozenset(config.get("zerofill_cols", ()))
+    ffill = frozenset(config.get("ffill_cols", ()))
+    return {
+        f: ("zero" if f in zerofill else "ffill" if f in ffill else None)
+        for f in config["fields"]
+    }
+
+def _field_dtypes(config: dict) -> Dict[str, np.dtype]:
+    """预计算单表字段的矩阵 dtype"""
+    overrides = config.get("dtype_overrides", {})
+    return {f: np.dtype(overrides.get(f, "float64")) for f in config["fields"]}
+
+# 字段清洗动作与矩阵 dtype 查找表，加载循环中单次 dict 查找即可确定
+FIELD_ACTIONS = MappingProxyType({t_name: _field_actions(config) for t_name, config in TABLE_REGISTRY.items()})
+FIELD_DTYPES = MappingProxyType({t_name: _field_dtypes(config) for t_name, config in TABLE_REGISTRY.items()})
 
 class MarketDownloadRequest(BaseModel):
     """
@@ -120,7 +179,11 @@ class MarketDownloadRequest(BaseModel):
     """
     table_name: str                      # 目标表名 (如: cn_stock_em_daily_adj)
     symbols: Optional[List[str]] = None  # 为空时自动获取全市场/全板块
-    months: Optional[List[str]] = None   # YYYYMM 格式 (Snapshot 表可为空)
+    # YYYYMM 格式 (Snapshot 表可为空)，格式校验由 pydantic-core 在请求解析阶段完成
+    months: Optional[List[Annotated[str, Field(pattern=r"^\d{6}$")]]] = None
+    # 增量下载：请求月份中在该月结束后写入 (按文件 mtime 判断) 的分区视为完整，其中已有的标的不再请求。
+    # 复制/恢复数据文件会改变 mtime，此时完整性判断可能失真，可置 force=True 忽略已落盘数据全部重新下载
+    force: bool = False
 
 class MarketQueryRequest(BaseModel):
     """
@@ -131,24 +194,70 @@ class MarketQueryRequest(BaseModel):
     end_date: date
     symbols: Optional[List[str]] = None
 
+def _locate(sorted_arr: np.ndarray, labels):
+    """
+    在升序标签数组中定位 labels，未命中返回 -1 (支持标量与数组)
+    """
+    if sorted_arr is None or len(sorted_arr) == 0:
+        return np.full(np.shape(labels), -1) if np.ndim(labels) else -1
+    idx = np.searchsorted(sorted_arr, labels)
+    safe_idx = np.minimum(idx, len(sorted_arr) - 1)
+    found = sorted_arr[safe_idx] == labels
+    return np.where(found, idx, -1) if np.ndim(labels) else (int(idx) if found else -1)
+
+def _json_matrix(arr: np.ndarray) -> list:
+    """
+    矩阵转 JSON 列表。float32 字段 (dtype_overrides) 直接 tolist 会暴露二进制误差 (1.23 -> 1.2300000190734863)，
+    转为 float64 后按 float32 精度 (7 位有效数字) 向量化舍入，JSON 中保持原始数值；Arrow IPC 路径仍传输 float32
+    """
+    if arr.dtype == np.float32:
+        arr = _round_significant(arr.astype(np.float64), 7)
+    return arr.tolist()
+
+def _round_significant(arr: np.ndarray, digits: int) -> np.ndarray:
+    """按有效数字舍入 (逐元素小数位 = digits - 1 - 数量级)，NaN/0 保持不变"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(arr)))
+    decimals = np.nan_to_num(digits - 1 - magnitude, nan=0.0, posinf=0.0, neginf=0.0)
+    # 10**22 以内的 10 的幂可精确表示，乘、舍入、除均为正确舍入，结果即最接近该十进制数的 float64
+    scale = 10.0 ** np.clip(decimals, 0, 22)
+    return np.round(arr * scale) / scale
+
 class TableData:
     """
     平铺数据单元 (Representing a single matrix Field or a Mapping)
     支持标签式查询: data["2024-01-01", "000001"]
     """
+    # 每次加载按 (表, 字段) 实例化，使用槽位省去实例 __dict__
+    __slots__ = ("name", "data", "_timeline_arr", "_symbol_arr")
+
     def __init__(self, 
                  name: str, 
                  timeline: Optional[List[str]] = None, 
                  symbols: Optional[List[str]] = None, 
                  data: any = None):
         self.name = name
-        self.timeline = timeline  # x-axis (dates)
-        self.symbols = symbols    # y-axis (assets)
-        self.data = data          # np.ndarray (2D Matrix) or List[Dict] (Snapshot Records)
+        self.data = data          # np.ndarray (2D Matrix) or pa.Table / List[Dict] (Snapshot Records) / Dict (键值映射)
         
-        # 索引计算缓存
-        self.date_to_idx = {d: i for i, d in enumerate(timeline)} if timeline else {}
-        self.symbol_to_idx = {s: i for i, s in enumerate(symbols)} if symbols else {}
+        # 索引数组：矩阵轨的 timeline/symbols 均为升序，标签定位使用 searchsorted (不再构建 Python dict)
+        # x-axis (dates) 以 datetime64[D] 保存，接受 ISO 日期字符串或 datetime64 数组
+        # y-axis (assets) 以字符串数组保存；传入已有数组时直接引用，同一张表的各字段共享同一份标的数组
+        self._timeline_arr = np.asarray(timeline, dtype="datetime64[D]") if timeline is not None else None
+        self._symbol_arr = np.asarray(symbols, dtype=str) if symbols is not None else None
+
+    @property
+    def timeline(self) -> Optional[List[str]]:
+        """时间轴的字符串形式 (YYYY-MM-DD)，仅在序列化等需要时生成"""
+        if self._timeline_arr is None:
+            return None
+        return self._timeline_arr.astype(str).tolist()
+
+    @property
+    def symbols(self) -> Optional[List[str]]:
+        """标的轴的列表形式，仅在序列化等需要时生成"""
+        if self._symbol_arr is None:
+            return None
+        return self._symbol_arr.tolist()
 
     def __getitem__(self, key):
         """
@@ -156,25 +265,51 @@ class TableData:
         矩阵轨：data["2024-01-01", "000001"] -> 返回数值
         映射轨：不再支持直接通过 [] 访问，请改用 get_value/get_list
         """
-        if isinstance(self.data, list):
+        if not isinstance(self.data, np.ndarray):
             # 映射轨道访问
             raise NotImplementedError(f"映射表不再支持 [] 访问，请使用 get_value(val, by=..., target=...)")
         
         if isinstance(key, tuple) and len(key) == 2:
             t_label, s_label = key
-            t_idx = self.date_to_idx.get(t_label)
-            s_idx = self.symbol_to_idx.get(s_label)
-            if t_idx is None or s_idx is None:
+            try:
+                t_idx = _locate(self._timeline_arr, np.datetime64(t_label, "D"))
+            except ValueError:
+                return np.nan
+            s_idx = _locate(self._symbol_arr, s_label)
+            if t_idx < 0 or s_idx < 0:
                 return np.nan
             return self.data[t_idx, s_idx]
             
         raise IndexError(f"TableData '{self.name}' 访问方式错误 (Key: {key})")
 
+    def get_many(self, t_labels, s_labels) -> np.ndarray:
+        """
+        矩阵轨批量取值：两次 searchsorted + 一次 fancy-index，未命中的标签返回 NaN
+        示例: get_many(["2024-01-02", "2024-01-03"], ["000001", "000002"])
+        """
+        if not isinstance(self.data, np.ndarray):
+            raise NotImplementedError(f"映射表不支持 get_many，请使用 get_value/get_list")
+
+        t_idx = _locate(self._timeline_arr, np.asarray(t_labels, dtype="datetime64[D]"))
+        s_idx = _locate(self._symbol_arr, np.asarray(s_labels, dtype=str))
+        hit = (t_idx >= 0) & (s_idx >= 0)
+        out = np.full(hit.shape, np.nan)
+        out[hit] = self.data[t_idx[hit], s_idx[hit]]
+        return out
+
     def get_value(self, val, by="stock_code", target="stock_name", default=None):
         """
         获取单值 (智能查询)
         示例: get_value("000001", by="stock_code", target="stock_name")
         """
+        if isinstance(self.data, pa.Table):
+            if by not in self.data.column_names or target not in self.data.column_names:
+                return default
+            hits = self._match(by, val)
+            return self.data.column(target)[hits[0]].as_py() if len(hits) else default
+        if isinstance(self.data, dict):
+            # 字典映射 (键 -> 值)：单次哈希查找，by/target 不参与
+            return self.data.get(val, default)
         if not isinstance(self.data, list):
             return default
             
@@ -189,6 +324,16 @@ class TableData:
         示例: get_list("半导体", by="sector_name", target="stock_code")
         确保永不返回 None，方便直接 for 循环
         """
+        if isinstance(self.data, pa.Table):
+            if by not in self.data.column_names or target not in self.data.column_names:
+                return []
+            return self.data.column(target).take(self._match(by, val)).drop_null().to_pylist()
+        if isinstance(self.data, dict):
+            # 字典映射：值为列表 (一对多) 时返回副本，单值包装为列表
+            hit = self.data.get(val)
+            if hit is None:
+                return []
+            return list(hit) if isinstance(hit, (list, tuple)) else [hit]
         if not isinstance(self.data, list):
             return []
             
@@ -200,12 +345,63 @@ class TableData:
                     results.append(t_val)
         return results
 
+    def _match(self, by: str, val) -> pa.Array:
+        """映射轨 (Arrow) 中 by 列等于 val 的行号；类型不可比较时视为无匹配"""
+        try:
+            return pc.indices_nonzero(pc.fill_null(pc.equal(self.data.column(by), val), False))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, TypeError):
+            return pa.array([], type=pa.uint64())
+
+    def as_numpy(self) -> Optional[np.ndarray]:
+        """矩阵轨返回底层 (Time, Symbol) 数组本身 (无拷贝)；映射轨返回 None"""
+        return self.data if isinstance(self.data, np.ndarray) else None
+
+    def to_arrow(self) -> pa.Table:
+        """
+        转为 Arrow 表，供 DuckDB/pandas 等下游直接消费
+        矩阵轨：宽表，首列 t 为时间轴 (date32)，其余每列一个标的 (先整体转置为连续内存，各列为零拷贝视图)
+        映射轨：每条记录一行 (已是 Arrow 表时仅替换 metadata，零拷贝)
+        schema metadata 记录 name/track (及映射轨的 symbols、矩阵轨的 dtype)，可由 from_arrow 还原
+        """
+        if not isinstance(self.data, np.ndarray):
+            metadata = {"name": self.name, "track": "mapping"}
+            if self.symbols is not None:
+                metadata["symbols"] = json.dumps(self.symbols)
+            if isinstance(self.data, pa.Table):
+                return self.data.replace_schema_metadata(metadata)
+            return pa.Table.from_pylist(self.data or [], metadata=metadata)
+
+        metadata = {"name": self.name, "track": "matrix", "dtype": self.data.dtype.str}
+        columns_major = np.ascontiguousarray(self.data.T)
+        timeline = self._timeline_arr if self._timeline_arr is not None else np.array([], dtype="datetime64[D]")
+        arrays = [pa.array(timeline)]
+        arrays.extend(pa.array(col) for col in columns_major)
+        return pa.Table.from_arrays(arrays, names=["t", *(self.symbols or [])], metadata=metadata)
+
+    @classmethod
+    def from_arrow(cls, tbl: pa.Table) -> "TableData":
+        """to_arrow 的逆操作：按 schema metadata 还原矩阵轨或映射轨"""
+        metadata = {k.decode(): v.decode() for k, v in (tbl.schema.metadata or {}).items()}
+        name = metadata.get("name", "")
+        if metadata.get("track") != "matrix":
+            symbols = json.loads(metadata["symbols"]) if "symbols" in metadata else None
+            return cls(name=name, symbols=symbols, data=tbl.replace_schema_metadata(None))
+
+        timeline = tbl.column("t").to_numpy(zero_copy_only=False)
+        dtype = np.dtype(metadata["dtype"])
+        if tbl.num_columns > 1:
+            data = np.column_stack([tbl.column(i).to_numpy(zero_copy_only=False) for i in range(1, tbl.num_columns)]).astype(dtype, copy=False)
+        else:
+            data = np.empty((tbl.num_rows, 0), dtype=dtype)
+        return cls(name=name, timeline=timeline, symbols=tbl.column_names[1:], data=data)
+
     def to_dict(self) -> dict:
         return {
             "name": self.name,
             "timeline": self.timeline,
             "symbols": self.symbols,
-            "data": self.data.tolist() if isinstance(self.data, np.ndarray) else self.data
+            "data": self.data.to_pylist() if isinstance(self.data, pa.Table)
+                    else _json_matrix(self.data) if isinstance(self.data, np.ndarray) else self.data
         }
 
 class MarketDataContainer:
@@ -224,3 +420,25 @@ class MarketDataContainer:
     def to_dict(self) -> dict:
         return {name: table.to_dict() for name, table in self.tables.items()}
 
+    def to_arrow_ipc(self) -> bytes:
+        """
+        序列化为连续的 Arrow IPC Stream (每个数据节点一个 stream，schema metadata 中的 name 为节点名)
+        矩阵数据直接以二进制列传输，避免 to_dict 中逐元素生成 Python float
+        """
+        sink = pa.BufferOutputStream()
+        for table in self.tables.values():
+            arrow_tbl = table.to_arrow()
+            with pa.ipc.new_stream(sink, arrow_tbl.schema) as writer:
+                writer.write_table(arrow_tbl)
+        return sink.getvalue().to_pybytes()
+
+    @classmethod
+    def from_arrow_ipc(cls, source) -> "MarketDataContainer":
+        """to_arrow_ipc 的逆操作 (source 为 bytes 或 pyarrow Buffer/内存映射文件)"""
+        reader = source if isinstance(source, pa.NativeFile) else pa.BufferReader(source)
+        tables = {}
+        while reader.tell() < reader.size():
+            table = TableData.from_arrow(pa.ipc.open_stream(reader).read_all())
+            tables[table.name] = table
+        return cls(tables)
+
@@ -1,5 +1,6 @@
 
 from datetime import datetime
+from typing import List
 from pydantic import BaseModel, Field
 
 class TaskStatus:
@@ -20,3 +21,9 @@ class DownloadTask(BaseModel):
     message: str = ""
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
+
+class TaskBatchStatusRequest(BaseModel):
+    """
+    批量任务状态查询参数
+    """
+    ids: List[str]
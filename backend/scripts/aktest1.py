@@ -9,25 +9,57 @@
 
 import sys
 import os
+import atexit
+import threading
 import akshare as ak
 import requests
 from curl_cffi.requests import Session
 #from get_em_cookie import *
 
-# 1. 创建一个持久的模拟浏览器 Session
-# impersonate="chrome110" 会自动模拟 Chrome 的 SSL 指纹和默认 Headers
-session = Session(impersonate="chrome120")
-
 # 手动注入 Cookie (从浏览器获取后粘贴至此，取消注释即可使用)
 EM_COOKIE = ""
 #EM_COOKIE = get_eastmoney_cookie()
-session.headers.update({"Cookie": EM_COOKIE})
 
-# 2. 全局替换 requests 的 get 和 post 方法
-# 这样后面所有的 akshare 调用都会默认使用这个模拟 session
-requests.get = session.get
-requests.post = session.post
+# curl_cffi 的 Session 非线程安全，每个线程持有一个独立的连接池
+_local = threading.local()
+_sessions = []
+_sessions_lock = threading.Lock()
+
+
+def get_session() -> Session:
+    """
+    获取当前线程的持久化模拟浏览器 Session。
+    impersonate="chrome120" 会自动模拟 Chrome 的 SSL 指纹和默认 Headers，
+    keep-alive + 连接池复用可避免每次请求重复 TLS 握手。
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = Session(impersonate="chrome120", max_clients=20)
+        session.headers.update({
+            "Connection": "keep-alive",
+            "Cookie": EM_COOKIE,
+        })
+        _local.session = session
+        with _sessions_lock:
+            _sessions.append(session)
+    return session
+
+
+def _close_sessions():
+    with _sessions_lock:
+        for session in _sessions:
+            session.close()
+        _sessions.clear()
+
+
+atexit.register(_close_sessions)
+
+# 全局替换 requests 的 get 和 post 方法 (仅在导入时执行一次)
+# 这样后面所有的 akshare 调用都会复用当前线程的模拟 session
+requests.get = lambda *args, **kwargs: get_session().get(*args, **kwargs)
+requests.post = lambda *args, **kwargs: get_session().post(*args, **kwargs)
 
-#df = ak.stock_zh_a_hist(symbol="000001")
-df = ak.stock_board_industry_name_em()
-print(df)
+if __name__ == "__main__":
+    #df = ak.stock_zh_a_hist(symbol="000001")
+    df = ak.stock_board_industry_name_em()
+    print(df)
@@ -1,13 +1,19 @@
+import threading
 from loguru import logger
 
 class ComputeService:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls):
+        # 双重检查加锁：仅首次构造时加锁，实例完成初始化后才对外可见
         if cls._instance is None:
-            cls._instance = super(ComputeService, cls).__new__(cls)
-            # Placeholder for Numba JIT configuration
-            cls._instance.jit_enabled = False 
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super(ComputeService, cls).__new__(cls)
+                    # Placeholder for Numba JIT configuration
+                    instance.jit_enabled = False 
+                    cls._instance = instance
         return cls._instance
 
     def execute_strategy(self, code: str, context: dict):
@@ -1,71 +1,202 @@
 import os
+import time
+import functools
+import threading
 import duckdb
 import numpy as np
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 from typing import List, Dict, Optional
 from datetime import date
 
 from core.exceptions import DataNotFoundError
 from core.config import settings
-from models.market import TableData, MarketDataContainer
+from models.market import TableData, MarketDataContainer, TABLE_REGISTRY, FIELD_ACTIONS, FIELD_DTYPES
 
-from core.sql_builder import build_pivot_sql, build_snapshot_query_sql
-from services.utils.processor import ffill_2d, zero_fill
+from core.sql_builder import build_long_sql, build_distinct_symbols_sql, build_metadata_sql
+from services.utils.processor import ffill_2d
+from services.query_cache import query_cache
+
+def _parquet_mtime_key(t_path: str) -> tuple:
+    """
+    计算表路径的变更指纹 (文件数, 最大 mtime_ns)。
+    仅 stat 文件，不打开 Parquet；任何 save_month/save_snapshot 都会改变该指纹。
+    """
+    if os.path.isfile(t_path):
+        return (1, os.stat(t_path).st_mtime_ns)
+    mtimes = [p.stat().st_mtime_ns for p in Path(t_path).rglob("*.parquet")]
+    return (len(mtimes), max(mtimes, default=0))
+
+def _footer_audit(t_path: str, is_timeseries: bool) -> Optional[tuple]:
+    """
+    仅读取 Parquet footer 完成审计：行数取自 num_rows，日期范围取自 trade_date 列的 Row Group 统计值，不扫描数据页。
+    统计值缺失或类型非 DATE 时返回 None，由调用方回退到 SQL 审计。
+    """
+    files = [t_path] if os.path.isfile(t_path) else sorted(Path(t_path).rglob("*.parquet"))
+    row_count, start, end = 0, None, None
+    for f in files:
+        meta = pq.read_metadata(f)
+        row_count += meta.num_rows
+        if not is_timeseries or meta.num_rows == 0:
+            continue
+        names = meta.schema.names
+        if "trade_date" not in names:
+            return None
+        col = names.index("trade_date")
+        for i in range(meta.num_row_groups):
+            rg = meta.row_group(i)
+            stats = rg.column(col).statistics
+            if rg.num_rows == 0:
+                continue
+            if stats is None or not stats.has_min_max or type(stats.min) is not date:
+                return None
+            start = stats.min if start is None else min(start, stats.min)
+            end = stats.max if end is None else max(end, stats.max)
+    return (start and start.isoformat(), end and end.isoformat(), row_count)
+
+# 多表查询的表级并行加载线程池；DuckDB 单查询内部已多线程，线程数保持较小
+_load_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="table-load")
+# 字段级矩阵重组线程池 (NumPy 散列赋值/前值填充释放 GIL)；与表级线程池分离，避免嵌套提交时互相等待
+_field_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="field-build")
 
 class DataManager:
     _instance = None
+    _instance_lock = threading.Lock()
 
     def __new__(cls):
+        # 双重检查加锁：仅首次构造时加锁，实例完成初始化后才对外可见
         if cls._instance is None:
-            cls._instance = super(DataManager, cls).__new__(cls)
-            cls._instance.conn = duckdb.connect(database=":memory:")
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super(DataManager, cls).__new__(cls)
+                    conn = duckdb.connect(database=":memory:")
+                    # 多年份分区的小文件并行读取；缓存 Parquet 元数据 (按文件修改时间校验)；服务端无需进度条
+                    conn.execute(f"SET threads={os.cpu_count() or 1}")
+                    conn.execute("SET enable_object_cache=true")
+                    conn.execute("SET enable_progress_bar=false")
+                    if settings.DUCKDB_MEMORY_LIMIT:
+                        conn.execute("SET memory_limit=?", [settings.DUCKDB_MEMORY_LIMIT])
+                    instance.conn = conn
+                    instance._local = threading.local()
+                    instance._meta_cache = None  # (DATA_DIR, 生成时间, metadata)
+                    instance._meta_lock = threading.Lock()
+                    cls._instance = instance
         return cls._instance
 
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        """
+        获取当前线程的 DuckDB 游标。单个连接不支持跨线程并发 execute，
+        各线程持有独立游标 (共享同一内存库与配置)。
+        """
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self.conn.cursor()
+            self._local.cursor = cursor
+        return cursor
+
     def initialize(self):
         """初始化数据环境"""
         logger.info(f"配置驱动双轨加载引擎启动。根目录: {settings.DATA_DIR}")
+        # 后台预热：全表审计会读取所有分区的 Parquet footer，填充 DuckDB 对象缓存与元数据缓存，首个查询免去冷读
+        threading.Thread(target=self._warm_up, name="metadata-warmup", daemon=True).start()
+
+    def _warm_up(self):
+        try:
+            started = time.perf_counter()
+            tables = self.get_storage_metadata()
+            logger.info(f"元数据预热完成: {len(tables)} 张表, 耗时 {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            logger.warning(f"元数据预热失败: {e}")
+
+    # 全表元数据结果的缓存有效期 (秒)，写入路径会主动失效
+    METADATA_TTL = 30
 
     def get_storage_metadata(self) -> Dict[str, Dict]:
         """
         元数据审计：基于配置中心 (TABLE_REGISTRY) 进行 O(1) 路径检查。
-        严禁扫描整个 data 目录。
+        严禁扫描整个 data 目录。结果在 METADATA_TTL 内复用。
         """
-        from models.market import TABLE_REGISTRY
+        with self._meta_lock:
+            cached = self._meta_cache
+        if cached and cached[0] == settings.DATA_DIR and time.monotonic() - cached[1] < self.METADATA_TTL:
+            return cached[2]
+
+        # 各表审计相互独立 (每线程独立游标)，并行读取 footer
+        names = list(TABLE_REGISTRY)
         metadata = {}
+        for t_name, info in zip(names, _load_pool.map(self._table_metadata, names)):
+            if info:
+                metadata[t_name] = info
 
-        for t_name, config in TABLE_REGISTRY.items():
-            storage_type = config.get("storage_type", "partition")
-            
-            # 路径定义
-            if storage_type == "snapshot":
-                # 快照模式：路径固定为 data/{table}/{table}.parquet
-                t_path = os.path.join(settings.DATA_DIR, t_name, f"{t_name}.parquet")
-            else:
-                # 分区模式：路径为 data/{table}/
-                t_path = os.path.join(settings.DATA_DIR, t_name)
+        with self._meta_lock:
+            self._meta_cache = (settings.DATA_DIR, time.monotonic(), metadata)
+        return metadata
 
-            if not os.path.exists(t_path):
-                continue
+    def invalidate_metadata(self):
+        """数据写入后调用，使全表元数据缓存失效"""
+        with self._meta_lock:
+            self._meta_cache = None
 
-            try:
-                # 配置驱动：根据 TABLE_REGISTRY 判定是否为时序表
-                is_timeseries = (config.get("load_mode") == "matrix") or (config.get("storage_type") == "partition")
-                from core.sql_builder import build_metadata_sql
-                sql = build_metadata_sql(t_path, is_timeseries=is_timeseries)
-                res = self.conn.execute(sql).fetchone()
-                
-                if res and res[2] > 0: # row_count > 0
-                    metadata[t_name] = {
-                        "start_date": res[0],
-                        "end_date": res[1],
-                        "row_count": res[2],
-                        "path": t_path,
-                        "storage_type": storage_type
-                    }
-            except Exception as e:
-                logger.warning(f"审计表 {t_name} 失败 (路径: {t_path}): {e}")
-                continue
-        return metadata
+    def _table_metadata(self, t_name: str) -> Optional[Dict]:
+        """
+        单表元数据审计，表不存在或为空时返回 None。
+        查询路径仅审计被请求的表，不再遍历整个注册中心。
+        """
+        config = TABLE_REGISTRY.get(t_name)
+        if not config:
+            return None
+        storage_type = config.get("storage_type", "partition")
+        
+        # 路径定义 (统一为 POSIX 形式，下游 SQL 拼装直接使用)
+        if storage_type == "snapshot":
+            # 快照模式：路径固定为 data/{table}/{table}.parquet
+            t_path = Path(settings.DATA_DIR, t_name, f"{t_name}.parquet").as_posix()
+        else:
+            # 分区模式：路径为 data/{table}/
+            t_path = Path(settings.DATA_DIR, t_name).as_posix()
+
+        if not os.path.exists(t_path):
+            return None
+
+        try:
+            # 配置驱动：根据 TABLE_REGISTRY 判定是否为时序表
+            is_timeseries = (config.get("load_mode") == "matrix") or (config.get("storage_type") == "partition")
+            res = self._audit_table(t_path, is_timeseries, _parquet_mtime_key(t_path))
+        except Exception as e:
+            logger.warning(f"审计表 {t_name} 失败 (路径: {t_path}): {e}")
+            return None
+
+        if not res or res[2] <= 0: # row_count > 0
+            return None
+        return {
+            "start_date": res[0],
+            "end_date": res[1],
+            "row_count": res[2],
+            "path": t_path,
+            "storage_type": storage_type
+        }
+
+    @functools.lru_cache(maxsize=64)
+    def _audit_table(self, t_path: str, is_timeseries: bool, mtime_key: tuple):
+        """
+        执行元数据审计：优先仅读 footer，统计信息不可用时回退到 SQL。结果按 (路径, 变更指纹) 缓存，磁盘未变化时直接命中。
+        """
+        res = _footer_audit(t_path, is_timeseries)
+        if res is not None:
+            return res
+        sql = build_metadata_sql(t_path, is_timeseries=is_timeseries)
+        return self._cursor().execute(sql).fetchone()
+
+    @functools.lru_cache(maxsize=64)
+    def _get_symbols(self, paths: tuple, id_col: str, years: tuple, mtime_key: tuple) -> tuple:
+        """
+        枚举年份范围内分区的全部标的。按 (路径, 年份范围, 变更指纹) 缓存，写入新分区后自动失效。
+        """
+        sql, params = build_distinct_symbols_sql(list(paths), id_col, *years)
+        return tuple(r[0] for r in self._cursor().execute(sql, params).fetchall())
 
     def load_market_data(self, 
                           table_names: List[str], 
@@ -74,13 +205,28 @@ class DataManager:
                           symbols: Optional[List[str]] = None) -> MarketDataContainer:
         """
         主入口: 根据 TABLE_REGISTRY 配置分流至具体加载轨道
+        相同参数且源文件未变化时直接命中查询缓存
         """
-        from models.market import TABLE_REGISTRY
-        all_tables_data = {}
-        meta = self.get_storage_metadata()
+        fingerprint = tuple(_parquet_mtime_key(os.path.join(settings.DATA_DIR, t)) for t in table_names)
+        cache_key = query_cache.make_key(table_names, start_date, end_date, symbols, fingerprint)
+        cached = query_cache.get(cache_key, end_date)
+        if cached is not None:
+            return cached
 
+        container = self._load_market_data(table_names, start_date, end_date, symbols)
+        query_cache.put(cache_key, end_date, container)
+        return container
+
+    def _load_market_data(self,
+                          table_names: List[str],
+                          start_date: date,
+                          end_date: date,
+                          symbols: Optional[List[str]] = None) -> MarketDataContainer:
+        # 1. 顺序解析各表元数据与路径 (数据缺失时尽早抛出)
+        jobs = []
         for t_name in table_names:
-            if t_name not in meta:
+            t_meta = self._table_metadata(t_name)
+            if not t_meta:
                 raise DataNotFoundError(t_name)
             
             config = TABLE_REGISTRY.get(t_name)
@@ -88,90 +234,113 @@ class DataManager:
                 logger.warning(f"表 {t_name} 未在 TABLE_REGISTRY 中注册，跳过。")
                 continue
 
-            storage_type = meta[t_name].get("storage_type", "partition")
+            storage_type = t_meta.get("storage_type", "partition")
             
             if storage_type == "snapshot":
                 # 快照模式：直接使用单一 Parquet 文件
-                parquet_paths = [meta[t_name]["path"]]
+                parquet_paths = [t_meta["path"]]
             else:
-                # 分区模式：根据年份加载多个文件
-                t_dir = meta[t_name]["path"]
-                year_dirs = [d for d in os.listdir(t_dir) if d.startswith("year=")]
-                years = []
-                for d in year_dirs:
-                    try:
-                        y = int(d.split("=")[1])
-                        if start_date.year <= y <= end_date.year:
-                            years.append(y)
-                    except: continue
-
-                if not years:
+                # 分区模式：整表 glob 交由 DuckDB 展开，按 hive 分区列 year 裁剪文件
+                first_year, last_year = int(t_meta["start_date"][:4]), int(t_meta["end_date"][:4])
+                if end_date.year < first_year or start_date.year > last_year:
                     raise DataNotFoundError(t_name, start_date, end_date)
-                parquet_paths = [os.path.join(t_dir, f"year={y}", "*.parquet") for y in years]
+                parquet_paths = [f"{t_meta['path']}/**/*.parquet"]
 
             # 双轨分流
             if config["load_mode"] == "matrix":
-                results = self._load_matrix_track(t_name, config, parquet_paths, start_date, end_date, symbols)
-                all_tables_data.update(results)
+                track = self._load_matrix_track
             elif config["load_mode"] == "mapping":
-                result = self._load_mapping_track(t_name, config, parquet_paths, start_date, end_date, symbols)
-                all_tables_data[t_name] = result
+                track = self._load_mapping_track
+            else:
+                continue
+            jobs.append((t_name, track, config, parquet_paths))
+
+        # 2. 多表并行加载 (DuckDB/Arrow 扫描释放 GIL)，单表时直接在当前线程执行
+        def run(job):
+            t_name, track, config, parquet_paths = job
+            return track(t_name, config, parquet_paths, start_date, end_date, symbols)
 
+        if len(jobs) > 1:
+            results = list(_load_pool.map(run, jobs))
+        else:
+            results = [run(job) for job in jobs]
+
+        # 3. 按请求顺序合并结果
+        all_tables_data = {}
+        for (t_name, _, _, _), result in zip(jobs, results):
+            if isinstance(result, TableData):
+                all_tables_data[t_name] = result
+            else:
+                all_tables_data.update(result)
         return MarketDataContainer(all_tables_data)
 
     def _load_matrix_track(self, t_name, config, paths, start_date, end_date, symbols) -> Dict[str, TableData]:
         """
-        矩阵轨：高性能 PIVOT 加载行情字段
+        矩阵轨：长表查询 + NumPy 散列赋值重组 (Time, Symbol) 矩阵
         """
         id_col, fields = config["id_col"], config["fields"]
         
-        # 1. 生成 SQL 并执行
-        sql = build_pivot_sql(t_name, paths, id_col, fields, str(start_date), str(end_date), symbols)
-        raw_dict = self.conn.execute(sql).fetchnumpy()
-        
-        if 't' not in raw_dict or len(raw_dict['t']) == 0:
+        # 0. 未指定 symbols 时使用分区内全部标的 (缓存)，作为矩阵的标的轴
+        if not symbols:
+            t_dir = os.path.join(settings.DATA_DIR, t_name)
+            years = (start_date.year, end_date.year)
+            symbols = self._get_symbols(tuple(paths), id_col, years, _parquet_mtime_key(t_dir))
+            if not symbols:
+                return {}
+
+        # 1. 生成 SQL 并执行 (参数绑定)，以 Arrow 取回长表
+        actions = FIELD_ACTIONS[t_name]
+        zerofill_cols = [f for f in fields if actions[f] == "zero"]
+        sql, params = build_long_sql(paths, id_col, fields, str(start_date), str(end_date), symbols, zerofill_cols)
+        arrow_tbl = self._cursor().execute(sql, params).fetch_arrow_table()
+        if arrow_tbl.num_rows == 0:
             return {}
 
-        # 1. Key 归一化：清除所有 Key 中的双引号，应对 DuckDB 自动添加引号的情况
-        clean_dict = {k.replace('"', ''): v for k, v in raw_dict.items()}
-
-        # 2. 精准反推 Symbol：通过后缀匹配从列名中还原标的代码
-        # 严禁使用 split，因为标的代码本身可能包含特殊符号
-        field_suffix = f"_{fields[0]}"
-        raw_symbols = set()
-        for k in clean_dict.keys():
-            if k.endswith(field_suffix):
-                # 截取后缀前的部分即为 Symbol
-                s_name = k[:-len(field_suffix)]
-                raw_symbols.add(s_name)
-        unique_symbols = sorted(list(raw_symbols))
-        
-        # 3. 字段平铺与矩阵重组
-        timeline = clean_dict['t'].astype(str).tolist()
-        track_results = {}
+        # 2. 坐标计算：时间轴取数据中出现的日期，标的轴为请求的全部标的 (无数据的标的整列为 NaN)
+        dates = arrow_tbl.column("trade_date").to_numpy(zero_copy_only=False)
+        unique_dates, t_idx = np.unique(dates, return_inverse=True)
+        # 标的数组只构建一次，由本表所有字段的 TableData 共享引用
+        unique_symbols = np.asarray(sorted(set(symbols)), dtype=str)
+        s_idx = np.searchsorted(
+            unique_symbols,
+            arrow_tbl.column(id_col).to_numpy(zero_copy_only=False).astype(str)
+        )
+        # 时间轴保持 datetime64[D]，字符串仅在序列化时生成
+        timeline = unique_dates.astype("datetime64[D]")
+
+        # 3. 字段重组：按 dtype 分组，每组分配一个连续 3D 块，每个字段一次 fancy-index 散列赋值
+        # 补零字段：SQL 已 COALESCE 行内空值，缺失行由初始填充值 0 覆盖，无需额外清洗
+        dtypes = FIELD_DTYPES[t_name]
+        groups: Dict[np.dtype, List[str]] = {}
         for f in fields:
-            # 创建 2D 矩阵 (Time, Symbol)
-            mat = np.full((len(timeline), len(unique_symbols)), np.nan)
-            
-            # 使用归一化后的 Key 直接访问，彻底消除逻辑抖动
-            for s_idx, s_val in enumerate(unique_symbols):
-                k = f"{s_val}_{f}"
-                if k in clean_dict:
-                    val = clean_dict[k]
-                    if hasattr(val, 'mask'):
-                        val = val.astype(np.float64).filled(np.nan)
-                    mat[:, s_idx] = val
-            
-            # 4. 向量化清洗
-            if f in config.get("zerofill_cols", []):
-                mat = zero_fill(mat)
-            elif f in config.get("ffill_cols", []):
-                mat = ffill_2d(mat)
-                
-            flat_name = f"{t_name}_{f}"
-            track_results[flat_name] = TableData(name=flat_name, timeline=timeline, symbols=unique_symbols, data=mat)
-            
-        return track_results
+            groups.setdefault(dtypes[f], []).append(f)
+        slices = {}
+        for dt, group in groups.items():
+            block = np.empty((len(group), len(timeline), len(unique_symbols)), dtype=dt)
+            slices.update({f: block[i] for i, f in enumerate(group)})
+
+        # 4. 各字段互不依赖，多字段时并行重组
+        def build(f):
+            return self._build_field_matrix(t_name, f, actions[f], slices[f], arrow_tbl, t_idx, s_idx, timeline, unique_symbols)
+
+        if len(fields) > 1:
+            return dict(_field_pool.map(build, fields))
+        return dict(build(f) for f in fields)
+
+    @staticmethod
+    def _build_field_matrix(t_name, f, action, mat, arrow_tbl, t_idx, s_idx, timeline, unique_symbols):
+        """
+        单字段矩阵重组：初始填充 -> 散列赋值 -> (可选) 前值填充，返回 (扁平名, TableData)
+        """
+        mat.fill(0.0 if action == "zero" else np.nan)
+        mat[t_idx, s_idx] = arrow_tbl.column(f).to_numpy(zero_copy_only=False)
+
+        # 前值填充需要完整 (Time, Symbol) 网格 (缺失行不在长表中)，结果写回块内切片，TableData 仍引用同一 dtype 块
+        if action == "ffill":
+            ffill_2d(mat, out=mat)
+
+        flat_name = f"{t_name}_{f}"
+        return flat_name, TableData(name=flat_name, timeline=timeline, symbols=unique_symbols, data=mat)
 
     def _load_mapping_track(self, t_name, config, paths, start_date, end_date, symbols) -> TableData:
         """
@@ -186,21 +355,20 @@ class DataManager:
         parquet_path = paths[0]
         
         # 如果指定了 symbols，假设是指 id_col (仅作简单过滤，完全过滤由 TableData 接手)
-        filters = None
         id_col = config.get("id_col") 
+        filter_expr = None
         if symbols and id_col:
-            filters = {id_col: symbols}
+            filter_expr = ds.field(id_col).isin([str(s) for s in symbols])
 
-        sql = build_snapshot_query_sql(parquet_path, fields, filters)
-        
-        # 3. 执行查询并转换为 List[Dict]
-        # fetch_arrow_table().to_pylist() 是最高效的转换方式之一
-        records = self.conn.execute(sql).fetch_arrow_table().to_pylist()
+        # 3. 直接以 PyArrow Dataset 读取 (列投影 + 谓词下推)，映射表无需经过 SQL 解析/规划
+        # 保持 Arrow 表，仅在序列化时物化为 Python 对象
+        dset = ds.dataset(parquet_path, format="parquet")
+        arrow_tbl = dset.to_table(columns=list(fields), filter=filter_expr)
 
         # 4. 封装
-        # 映射表中 timeline 通常为空，symbols 可以是所有记录的 id_col 集合
-        all_symbols = [r.get(id_col) for r in records] if id_col else []
+        # 映射表中 timeline 通常为空，symbols 为所有记录的 id_col (仅物化这一列)
+        all_symbols = arrow_tbl.column(id_col).to_pylist() if id_col in arrow_tbl.column_names else []
         
-        return TableData(name=t_name, symbols=all_symbols, data=records)
+        return TableData(name=t_name, symbols=all_symbols, data=arrow_tbl)
 
 data_manager = DataManager()
@@ -3,11 +3,22 @@ from abc import ABC, abstractmethod
 import pandas as pd
 from typing import List, Optional
 
+from requests.exceptions import RequestException
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+
+# 网络请求重试策略：仅对网络类异常重试 (指数退避)，程序错误直接抛出，不再空等退避时间
+network_retry = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=0.5, max=4),
+    retry=retry_if_exception_type((RequestException, ConnectionError, TimeoutError)),
+    reraise=True,
+)
+
 class BaseDownloader(ABC):
     """
     Abstract interface for market data downloaders.
     """
-    
+
     @abstractmethod
     def fetch_sector_daily(self, sector_name: str, start_date: str, end_date: str, adjust: str = "adj") -> pd.DataFrame:
         """
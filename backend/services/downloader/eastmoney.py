@@ -1,22 +1,68 @@
+import asyncio
+import functools
+from datetime import date
 from typing import List
 import akshare as ak
 import pandas as pd
 from loguru import logger
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 
-from services.downloader.base import BaseDownloader
+from services.downloader.base import BaseDownloader, network_retry
 from core.config import settings
+from models.market import DATA_SCHEMA
+
+@functools.lru_cache(maxsize=8)
+def _daily_list(fetch, column: str, day_key: str) -> tuple:
+    """
+    列表类接口 (板块名、全市场代码) 按自然日缓存：成分每日至多变化一次，重复任务无需再次请求
+    异常不会被 lru_cache 缓存，失败后下次调用会重新请求
+    """
+    return tuple(fetch()[column].tolist())
+
+
+# Schema 列名集合，供 _filter_schema 批量比对
+SCHEMA_COLUMNS = frozenset(DATA_SCHEMA)
+
+# 东财日线列名 -> 标准字段 (均在 DATA_SCHEMA 中)
+DAILY_COLUMN_MAP = {
+    "日期": "trade_date",
+    "开盘": "open",
+    "收盘": "close",
+    "最高": "high",
+    "最低": "low",
+    "成交量": "volume",
+    "成交额": "amount",
+    "振幅": "amplitude",
+    "涨跌幅": "pct_change",
+    "涨跌额": "change_amount",
+    "换手率": "turnover"
+}
+
+def _standardize_daily(df: pd.DataFrame, id_col: str, id_val: str) -> pd.DataFrame:
+    """
+    一次性构建标准化日线 DataFrame：仅取映射内的列 (天然满足 DATA_SCHEMA)，
+    不再经过 rename -> 逐列改写 -> 列筛选的多次整表拷贝
+    """
+    columns = {}
+    for src, dst in DAILY_COLUMN_MAP.items():
+        if dst == "trade_date":
+            # 保持 datetime64 (按日)，写入时由 Arrow 向量化转为 DATE，不再逐行生成 Python date 对象
+            columns[dst] = pd.to_datetime(df[src], cache=True).to_numpy(dtype="datetime64[D]")
+        elif dst == "volume":
+            vol = df[src].to_numpy(dtype="float64", copy=True)
+            vol *= 100.0 # 统一单位为“股” (原地乘，不再额外分配)
+            columns[dst] = vol
+        elif src in df.columns:
+            columns[dst] = df[src].to_numpy()
+    out = pd.DataFrame(columns)
+    out[id_col] = id_val
+    return out
 
 
 class EastMoneyDownloader(BaseDownloader):
     """
     Implementation of BaseDownloader using AkShare (EastMoney).
     """
-    @retry(
-        stop=stop_after_attempt(3), 
-        wait=wait_fixed(2), 
-        retry=retry_if_exception_type(Exception)
-    )
+    @network_retry
     def fetch_sector_daily(self, sector_name: str, start_date: str, end_date: str, adjust: str = "adj") -> pd.DataFrame:
         try:
             # 东财板块暂不支持复权选择，默认为 raw(不复权) 处理，但接口保留参数
@@ -28,40 +74,12 @@ class EastMoneyDownloader(BaseDownloader):
                 adjust="hfq" if adjust == "adj" else ""
             )
             
-            # 标准化映射
-            rename_map = {
-                "日期": "trade_date",
-                "开盘": "open",
-                "收盘": "close",
-                "最高": "high",
-                "最低": "low",
-                "成交量": "volume",
-                "成交额": "amount",
-                "振幅": "amplitude",
-                "涨跌幅": "pct_change",
-                "涨跌额": "change_amount",
-                "换手率": "turnover"
-            }
-            df = df.rename(columns=rename_map)
-            
-            # 后处理
-            df['volume'] = df['volume'].astype("float64") * 100.0 # 统一单位为“股”
-            df['trade_date'] = pd.to_datetime(df['trade_date']).dt.date
-            df['sector_name'] = sector_name
-            
-            # 严格筛选：仅保留在 DATA_SCHEMA 中定义的字段
-            from models.market import DATA_SCHEMA
-            valid_cols = [c for c in df.columns if c in DATA_SCHEMA]
-            return df[valid_cols]
+            return _standardize_daily(df, "sector_name", sector_name)
         except Exception as e:
             logger.error(f"Error fetching EastMoney sector data for {sector_name}: {e}")
-            raise e
+            raise
 
-    @retry(
-        stop=stop_after_attempt(3), 
-        wait=wait_fixed(2), 
-        retry=retry_if_exception_type(Exception)
-    )
+    @network_retry
     def fetch_stock_daily(self, symbol: str, start_date: str, end_date: str, adjust: str = "adj") -> pd.DataFrame:
         try:
             # 映射 CarrotQuant 术语到 AkShare 术语
@@ -76,39 +94,14 @@ class EastMoneyDownloader(BaseDownloader):
                 adjust=ak_adjust
             )
             
-            # 标准化映射
-            rename_map = {
-                "日期": "trade_date",
-                "开盘": "open",
-                "收盘": "close",
-                "最高": "high",
-                "最低": "low",
-                "成交量": "volume",
-                "成交额": "amount",
-                "振幅": "amplitude",
-                "涨跌幅": "pct_change",
-                "涨跌额": "change_amount",
-                "换手率": "turnover"
-            }
-            df = df.rename(columns=rename_map)
-            
-            # 后处理
-            df['volume'] = df['volume'].astype("float64") * 100.0 # 统一单位为“股”
-            df['trade_date'] = pd.to_datetime(df['trade_date']).dt.date
-            df['stock_code'] = symbol
-            
-            # 严格筛选：仅保留在 DATA_SCHEMA 中定义的字段
-            from models.market import DATA_SCHEMA
-            valid_cols = [c for c in df.columns if c in DATA_SCHEMA]
-            return df[valid_cols]
+            return _standardize_daily(df, "stock_code", symbol)
         except Exception as e:
             logger.error(f"Error fetching EastMoney stock data for {symbol} (adjust={adjust}): {e}")
-            raise e
+            raise
 
     def get_all_sectors(self) -> List[str]:
         try:
-            df = ak.stock_board_industry_name_em()
-            return df['板块名称'].tolist()
+            return list(_daily_list(ak.stock_board_industry_name_em, '板块名称', date.today().isoformat()))
         except Exception as e:
             logger.error(f"Error fetching EastMoney sector list: {e}")
             return []
@@ -116,8 +109,7 @@ class EastMoneyDownloader(BaseDownloader):
     def get_all_symbols(self) -> List[str]:
         """获取全量 A 股代码"""
         try:
-            df = ak.stock_zh_a_spot_em()
-            return df['代码'].tolist()
+            return list(_daily_list(ak.stock_zh_a_spot_em, '代码', date.today().isoformat()))
         except Exception as e:
             logger.error(f"Error fetching EastMoney all symbols: {e}")
             return []
@@ -130,16 +122,18 @@ class EastMoneyDownloader(BaseDownloader):
         if df.empty:
             return df
             
-        from models.market import DATA_SCHEMA
-        # 1. 仅保留在 Schema 中定义的列
-        valid_cols = [c for c in df.columns if c in DATA_SCHEMA]
+        # 1. 仅保留在 Schema 中定义的列 (列名批量比对)
+        keep = df.columns.isin(SCHEMA_COLUMNS)
         
         # 2. 如果没有任何有效列，返回空 DF (防止写入全空表)
-        if not valid_cols:
+        if not keep.any():
             logger.warning(f"数据清洗后无有效列 (原列: {df.columns.tolist()})")
             return pd.DataFrame()
-            
-        return df[valid_cols]
+
+        # 3. 列已全部合法 (如已标准化的成员表) 时直接返回，免去一次整表拷贝
+        if keep.all():
+            return df
+        return df.loc[:, keep]
 
     def fetch_stock_info(self) -> pd.DataFrame:
         """
@@ -161,10 +155,9 @@ class EastMoneyDownloader(BaseDownloader):
         获取行业板块基础信息
         """
         try:
-            df = ak.stock_board_industry_name_em()
-            df = df[['板块名称']]
-            df.columns = ['sector_name']
-            return self._filter_schema(df)
+            # 与板块列表共用按日缓存，同一天内快照下载与映射抓取只请求一次
+            names = _daily_list(ak.stock_board_industry_name_em, '板块名称', date.today().isoformat())
+            return self._filter_schema(pd.DataFrame({'sector_name': list(names)}))
         except Exception as e:
             logger.error(f"Error fetching sector info: {e}")
             return pd.DataFrame()
@@ -174,105 +167,87 @@ class EastMoneyDownloader(BaseDownloader):
         获取概念板块基础信息
         """
         try:
-            df = ak.stock_board_concept_name_em()
-            df = df[['板块名称']]
-            df.columns = ['concept_name']
-            return self._filter_schema(df)
+            # 与板块列表共用按日缓存，同一天内快照下载与映射抓取只请求一次
+            names = _daily_list(ak.stock_board_concept_name_em, '板块名称', date.today().isoformat())
+            return self._filter_schema(pd.DataFrame({'concept_name': list(names)}))
         except Exception as e:
             logger.error(f"Error fetching concept info: {e}")
             return pd.DataFrame()
 
-    async def fetch_stock_sector_map(self, progress_callback=None) -> pd.DataFrame:
+    # 板块成员抓取并发上限：受东财反爬限制，不宜过高
+    BOARD_FETCH_CONCURRENCY = 8
+
+    async def _fetch_board_members(self, boards: List[str], fetch_cons, name_col: str, label: str, progress_callback=None) -> pd.DataFrame:
         """
-        获取股票与行业的映射关系 (一对多)
-        鲁棒循环：前置审计 + 异常隔离 + info 级进度日志
+        并发抓取各板块成员 (信号量限流)，单个板块失败不影响整体
+        fetch_cons: akshare 成员接口 (如 ak.stock_board_industry_cons_em)
         """
-        import asyncio
-        sectors = self.get_all_sectors()
-        if len(sectors) == 0:
-            raise RuntimeError("行业板块列表为空，无法抓取映射关系")
-
-        results = []
+        sem = asyncio.Semaphore(self.BOARD_FETCH_CONCURRENCY)
+        # 板块名去重：板块间的行因 name_col 不同必然不重复，此后只需板块内去重
+        boards = list(dict.fromkeys(boards))
+        total = len(boards)
+        done = 0
         failed = []
-        total = len(sectors)
-        
-        for i, s in enumerate(sectors):
-            msg = f"正在抓取行业成员 ({i+1}/{total}): {s}"
+
+        async def fetch_one(board: str):
+            nonlocal done
+            async with sem:
+                try:
+                    cons = await asyncio.to_thread(fetch_cons, symbol=board)
+                except Exception as e:
+                    logger.warning(f"抓取{label} '{board}' 成员失败: {e}")
+                    failed.append(board)
+                    cons = None
+            done += 1
+            msg = f"正在抓取{label}成员 ({done}/{total}): {board}"
             logger.info(msg)
             if progress_callback:
-                progress_callback(round((i + 1) / total * 100, 2), msg)
-                
-            try:
-                cons = ak.stock_board_industry_cons_em(symbol=s)
-                if cons.empty:
-                    continue
-                # 保留代码和名称
-                cons = cons[['代码', '名称']].copy()
-                cons.columns = ['stock_code', 'stock_name']
-                cons['sector_name'] = s
-                results.append(cons)
-            except Exception as e:
-                logger.warning(f"抓取行业 '{s}' 成员失败: {e}")
-                failed.append(s)
-                continue
-            await asyncio.sleep(0.1)
+                progress_callback(round(done / total * 100, 2), msg)
+
+            if cons is None or cons.empty:
+                return None
+            # 保留代码和名称
+            cons = cons[['代码', '名称']].copy()
+            cons.columns = ['stock_code', 'stock_name']
+            cons[name_col] = board
+            # 逐批清洗去重，避免对合并后的整表再做一次哈希扫描
+            return self._filter_schema(cons).drop_duplicates()
+
+        results = [df for df in await asyncio.gather(*[fetch_one(b) for b in boards]) if df is not None]
 
         if failed:
-            logger.warning(f"共 {len(failed)} 个行业抓取失败: {failed[:10]}")
+            logger.warning(f"共 {len(failed)} 个{label}抓取失败: {failed[:10]}")
         if not results:
             return pd.DataFrame()
 
-        full_df = pd.concat(results)
-        # 去重并清洗
-        full_df = full_df.drop_duplicates()
-        return self._filter_schema(full_df)
+        return pd.concat(results, ignore_index=True)
+
+    async def fetch_stock_sector_map(self, progress_callback=None) -> pd.DataFrame:
+        """
+        获取股票与行业的映射关系 (一对多)
+        鲁棒并发：前置审计 + 异常隔离 + info 级进度日志
+        """
+        sectors = self.get_all_sectors()
+        if len(sectors) == 0:
+            raise RuntimeError("行业板块列表为空，无法抓取映射关系")
+
+        return await self._fetch_board_members(
+            sectors, ak.stock_board_industry_cons_em, "sector_name", "行业", progress_callback
+        )
 
     async def fetch_stock_concept_map(self, progress_callback=None) -> pd.DataFrame:
         """
         获取股票与概念的映射关系 (一对多)
-        鲁棒循环：前置审计 + 异常隔离 + info 级进度日志
+        鲁棒并发：前置审计 + 异常隔离 + info 级进度日志
         """
-        import asyncio
         try:
-            concept_df = ak.stock_board_concept_name_em()
-            concepts = concept_df['板块名称'].tolist()
+            concepts = list(_daily_list(ak.stock_board_concept_name_em, '板块名称', date.today().isoformat()))
         except Exception as e:
             raise RuntimeError(f"获取概念列表失败: {e}")
 
         if len(concepts) == 0:
             raise RuntimeError("概念板块列表为空，无法抓取映射关系")
 
-        results = []
-        failed = []
-        total = len(concepts)
-        
-        for i, c in enumerate(concepts):
-            msg = f"正在抓取概念成员 ({i+1}/{total}): {c}"
-            logger.info(msg)
-            if progress_callback:
-                progress_callback(round((i + 1) / total * 100, 2), msg)
-                
-            try:
-                cons = ak.stock_board_concept_cons_em(symbol=c)
-                if cons.empty:
-                    continue
-                # 保留代码和名称
-                cons = cons[['代码', '名称']].copy()
-                cons.columns = ['stock_code', 'stock_name']
-                cons['concept_name'] = c
-                results.append(cons)
-            except Exception as e:
-                logger.warning(f"抓取概念 '{c}' 成员失败: {e}")
-                failed.append(c)
-                continue
-            await asyncio.sleep(0.1)
-
-        if failed:
-            logger.warning(f"共 {len(failed)} 个概念抓取失败: {failed[:10]}")
-        if not results:
-            return pd.DataFrame()
-
-        full_df = pd.concat(results)
-        # 去重并清洗
-        full_df = full_df.drop_duplicates()
-        return self._filter_schema(full_df)
+        return await self._fetch_board_members(
+            concepts, ak.stock_board_concept_cons_em, "concept_name", "概念", progress_callback
+        )
@@ -0,0 +1,65 @@
+import sys
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# akshare 内部直接调用 requests.get/post，每次请求都新建 TCP + TLS 连接。
+# 这里将 akshare 各子模块引用的 requests 换成按线程持有 Session (keep-alive + 连接池) 的代理，批量下载时复用已建立的连接。
+# requests.Session 非线程安全，每个下载线程各自持有一个。
+_local = threading.local()
+# 单次 HTTP 请求超时 (连接, 读取)：akshare 默认 timeout=None，死连接会永久占住下载线程。
+# MarketDataManager.FETCH_TIMEOUT 仍是单标的抓取 (含重试) 的总上限
+HTTP_TIMEOUT = (5, 20)
+_install_lock = threading.Lock()
+_installed = False
+
+
+def get_session() -> requests.Session:
+    """获取当前线程的持久化 Session"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        # 重试由下载器的 tenacity 负责，连接池层不再重试
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+def _with_timeout(kwargs: dict) -> dict:
+    """未指定 (或显式传入 None) 超时的请求补上 HTTP_TIMEOUT"""
+    if kwargs.get("timeout") is None:
+        kwargs["timeout"] = HTTP_TIMEOUT
+    return kwargs
+
+
+class _PooledRequests:
+    """requests 模块代理：get/post 走线程级 Session 并补超时，其余属性 (exceptions、Session 等) 原样转发"""
+
+    def get(self, *args, **kwargs):
+        return get_session().get(*args, **_with_timeout(kwargs))
+
+    def post(self, *args, **kwargs):
+        return get_session().post(*args, **_with_timeout(kwargs))
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+def install_pooled_session():
+    """
+    将 akshare 子模块中的 `requests` 引用替换为连接池代理 (幂等，仅首次调用生效)。
+    只改 akshare 模块命名空间，全局 requests.get/post 及其他库不受影响。
+    需在 import akshare 之后、开始下载之前调用一次：应用在 lifespan 启动阶段安装，独立脚本自行调用。
+    """
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        import akshare  # noqa: F401  akshare 在包初始化时导入全部子模块
+        proxy = _PooledRequests()
+        for name, module in list(sys.modules.items()):
+            if name.startswith("akshare") and getattr(module, "requests", None) is requests:
+                module.requests = proxy
+        _installed = True
@@ -3,20 +3,18 @@ import akshare as ak
 import pandas as pd
 from loguru import logger
 from typing import List
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 
-from services.downloader.base import BaseDownloader
+from services.downloader.base import BaseDownloader, network_retry
+
+# 新浪日线列名 -> 标准字段 (其余列名已与 DATA_SCHEMA 一致)
+SINA_COLUMN_MAP = {"date": "trade_date"}
 
 class SinaDownloader(BaseDownloader):
     """
     新浪数据下载器实现。
     """
     
-    @retry(
-        stop=stop_after_attempt(3), 
-        wait=wait_fixed(2), 
-        retry=retry_if_exception_type(Exception)
-    )
+    @network_retry
     def fetch_stock_daily(self, symbol: str, start_date: str, end_date: str, adjust: str = "adj") -> pd.DataFrame:
         try:
             # 映射复权逻辑
@@ -30,27 +28,16 @@ class SinaDownloader(BaseDownloader):
                 adjust=ak_adjust if ak_adjust else "no" # ak 接口要求 'no' 代表不复权
             )
             
-            # 映射 CarrotQuant 术语
-            rename_map = {
-                "date": "trade_date",
-                "open": "open",
-                "close": "close",
-                "high": "high",
-                "low": "low",
-                "volume": "volume",
-                "amount": "amount",
-                "turnover": "turnover",
-                "outstanding_share": "outstanding_share"
-            }
-            df = df.rename(columns=rename_map)
+            # 映射 CarrotQuant 术语 (仅 date 列需改名，直接替换列索引，免去 rename 的整表拷贝)
+            df.columns = [SINA_COLUMN_MAP.get(c, c) for c in df.columns]
             
-            # 后处理
-            df['trade_date'] = pd.to_datetime(df['trade_date']).dt.date
+            # 后处理：trade_date 保持 datetime64 (按日)，写入时由 Arrow 向量化转为 DATE
+            df['trade_date'] = pd.to_datetime(df['trade_date'], cache=True).to_numpy(dtype="datetime64[D]")
             df['stock_code'] = symbol
             return df
         except Exception as e:
             logger.error(f"Error fetching Sina stock data for {symbol} (adjust={adjust}): {e}")
-            raise e
+            raise
 
     def fetch_sector_daily(self, sector_name: str, start_date: str, end_date: str, adjust: str = "adj") -> pd.DataFrame:
         # 新浪暂不支持板块数据，返回空
@@ -1,22 +1,50 @@
 
 import asyncio
+import functools
+import inspect
 import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from calendar import monthrange
+from collections import OrderedDict
 from typing import Dict, List, Optional
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from loguru import logger
 
 from core.config import settings
-from core.storage import DuckDBStorage
+from core.storage import DuckDBStorage, to_arrow_table, to_ipc_buffer, save_month_ipc
+from services.data import data_manager
 from services.downloader.base import BaseDownloader
 from services.downloader.eastmoney import EastMoneyDownloader
 from services.downloader.sina import SinaDownloader
+from services.utils.rate_limiter import AsyncRateLimiter
 from models.task import DownloadTask, TaskStatus
-from models.market import MarketDownloadRequest, MarketTable
+from models.market import MarketDownloadRequest, MarketTable, TABLE_REGISTRY
+
+# 下载专用线程池：工作线程常驻，线程级 HTTP Session (连接池) 在多个任务间持续复用
+_fetch_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="dl")
+
+def _fetch_table(handler, symbol: str, s_str: str, e_str: str, adjust: str) -> Optional[pa.Table]:
+    """在抓取线程中完成下载与 Arrow 转换 (按 DATA_SCHEMA)，空结果返回 None"""
+    df = handler(symbol, s_str, e_str, adjust)
+    if df is None or df.empty:
+        return None
+    return to_arrow_table(df)
 
 class MarketDataManager:
     """行情数据下载与存储协调服务 (重构版: 多源+路由)"""
+
+    # 单月内标的并发抓取上限 (可由 download_config.concurrency 按数据源覆盖)
+    SYMBOL_FETCH_CONCURRENCY = 8
+    # 各数据源的总请求速率上限 (次/秒)：东财容忍度高于新浪
+    SOURCE_RATE_LIMITS = {"em": 20, "sina": 10}
+    # 单标的抓取的总超时 (秒，含下载器内部重试)，可由 download_config.timeout 覆盖
+    FETCH_TIMEOUT = 60
+    # 单次请求合并的连续月份上限：每个标的一次请求覆盖整段区间，再按月切分落盘
+    MONTHS_PER_REQUEST = 12
+    # 任务状态保留上限 (仅淘汰已结束的任务)
+    MAX_TASKS = 1000
     
     def __init__(self):
         self.downloaders: Dict[str, BaseDownloader] = {
@@ -24,15 +52,22 @@ class MarketDataManager:
             "sina": SinaDownloader()
         }
         self.storage = DuckDBStorage(settings.DATA_DIR)
-        self.tasks: Dict[str, DownloadTask] = {}
+        # 按创建顺序保存，超过 MAX_TASKS 时淘汰最早的已结束任务
+        self.tasks: "OrderedDict[str, DownloadTask]" = OrderedDict()
         self.stop_events: Dict[str, asyncio.Event] = {}
+        # 分区写入进程池 (由应用生命周期注入)，为空时退化为线程写入
+        self.write_pool: Optional[ProcessPoolExecutor] = None
+        # 各 (year, month) 分区文件相互独立，允许并发写入，上限避免磁盘饱和
+        self.write_semaphore = asyncio.Semaphore(4)
+        self.rate_limiters: Dict[str, AsyncRateLimiter] = {
+            source: AsyncRateLimiter(rate) for source, rate in self.SOURCE_RATE_LIMITS.items()
+        }
         
     async def start_market_download_task(self, request: MarketDownloadRequest) -> str:
         """启动市场数据下载任务 (完全由 TABLE_REGISTRY 驱动)"""
         task_id = str(uuid.uuid4())
         
         # 1. 验证表是否存在
-        from models.market import TABLE_REGISTRY
         if request.table_name not in TABLE_REGISTRY:
             raise ValueError(f"不受支持的表名: {request.table_name}")
             
@@ -51,18 +86,19 @@ class MarketDataManager:
         symbols = request.symbols
         
         # 3. 自动计算 Symbols (如果未指定且为分区表)
+        # 列表按自然日缓存，但首次拉取为阻塞 HTTP，放到线程中执行避免卡住事件循环
         if not symbols and storage_type == "partition":
              if "sector" in request.table_name:
-                 symbols = downloader.get_all_sectors()
+                 symbols = await asyncio.to_thread(downloader.get_all_sectors)
              else:
-                 symbols = downloader.get_all_symbols()
+                 symbols = await asyncio.to_thread(downloader.get_all_symbols)
 
         task = DownloadTask(
             task_id=task_id, 
             status=TaskStatus.PENDING, 
             message=f"[{request.table_name}] 计划启动任务 (Storage: {storage_type})"
         )
-        self.tasks[task_id] = task
+        self._put_task(task)
         self.stop_events[task_id] = asyncio.Event()
         
         # 4. 驱动异步处理
@@ -72,7 +108,8 @@ class MarketDataManager:
             )
         else:
             asyncio.create_task(
-                self._run_partition_download(task_id, downloader, symbols, request.table_name, download_cfg, request.months)
+                self._run_partition_download(task_id, downloader, symbols, request.table_name, download_cfg, request.months,
+                                             force=request.force)
             )
         
         return task_id
@@ -99,7 +136,6 @@ class MarketDataManager:
             else:
                 # 同步方法若支持 progress_callback 则传递，否则维持原状
                 # 目前主要针对 mapping 类任务
-                import inspect
                 sig = inspect.signature(handler)
                 if "progress_callback" in sig.parameters:
                     df = await asyncio.to_thread(handler, progress_callback=progress_updater)
@@ -110,6 +146,7 @@ class MarketDataManager:
                 raise ValueError(f"[{table_name}] 下载器返回数据为空")
 
             await asyncio.to_thread(self.storage.save_snapshot, df=df, table_name=table_name)
+            data_manager.invalidate_metadata()
             
             task.progress = 100.0
             task.status = TaskStatus.COMPLETED
@@ -123,7 +160,8 @@ class MarketDataManager:
             task.updated_at = datetime.now()
             self.stop_events.pop(task_id, None)
 
-    async def _run_partition_download(self, task_id: str, downloader: BaseDownloader, symbols: List[str], table_name: str, download_cfg: dict, months: List[str]):
+    async def _run_partition_download(self, task_id: str, downloader: BaseDownloader, symbols: List[str], table_name: str, download_cfg: dict, months: List[str],
+                                      force: bool = False):
         """执行分区表下载"""
         task = self.tasks[task_id]
         task.status = TaskStatus.RUNNING
@@ -134,37 +172,69 @@ class MarketDataManager:
             months = [datetime.now().strftime("%Y%m")]
 
         try:
-            handler_name = download_cfg["handler"]
+            handler = getattr(downloader, download_cfg["handler"])
             adjust = download_cfg.get("adjust", "raw")
-            total_months = len(months)
+            sem = asyncio.Semaphore(download_cfg.get("concurrency", self.SYMBOL_FETCH_CONCURRENCY))
+            limiter = self.rate_limiters.get(download_cfg.get("source"))
+            timeout = download_cfg.get("timeout", self.FETCH_TIMEOUT)
+            batches = self._group_months(months)
+            total_months = sum(len(b) for b in batches)
+            done_months = 0
+            # 增量下载：已完整落盘的 (月份, 标的) 不再请求 (force 时全部重新下载)
+            id_col = TABLE_REGISTRY.get(table_name, {}).get("id_col")
+            coverage = {}
+            if id_col and not force:
+                requested = [(y, m) for batch in batches for _, _, y, m in batch]
+                coverage = await asyncio.to_thread(self.storage.get_symbol_month_coverage, table_name, id_col, requested)
+            # 月度写入在后台并发执行，抓取下一批月份时不再等待上一批落盘
+            pending_writes = []
 
-            for idx, month_str in enumerate(months):
+            for batch in batches:
                 if stop_event.is_set():
+                    await asyncio.gather(*pending_writes)
                     self._mark_stopped(task)
                     return
-                
-                s_str, e_str, year, month = self._get_date_range(month_str)
-                task.message = f"正在下载 {year}年{month}月 ({idx+1}/{total_months})"
+
+                # 连续月份合并为一个日期区间，每个标的只请求一次，再按月切分
+                s_str, e_str = batch[0][0], batch[-1][1]
+                _, _, first_y, first_m = batch[0]
+                _, _, last_y, last_m = batch[-1]
+                span = f"{first_y}年{first_m}月" if len(batch) == 1 else f"{first_y}年{first_m}月-{last_y}年{last_m}月"
+                task.message = f"正在下载 {span} (已完成 {done_months}/{total_months} 个月)"
                 task.updated_at = datetime.now()
-                
-                # 符号循环抓取
-                monthly_buffer = []
-                for i, symbol in enumerate(symbols):
-                    if stop_event.is_set(): break
-                    try:
-                        handler = getattr(downloader, handler_name)
-                        df = await asyncio.to_thread(handler, symbol, s_str, e_str, adjust)
-                        if not df.empty: monthly_buffer.append(df)
-                    except Exception as e:
-                        logger.error(f"标的 {symbol} 下载失败: {e}")
-                    await asyncio.sleep(0.1)
-
-                if monthly_buffer:
-                    full_df = pd.concat(monthly_buffer)
-                    await asyncio.to_thread(self.storage.save_month, df=full_df, table_name=table_name, year=year, month=month)
-                
-                task.progress = round(((idx + 1) / total_months) * 100, 2)
+
+                covered = {(y, m): coverage.get((y, m), frozenset()) for _, _, y, m in batch}
+                # 区间内任一月份缺失的标的都需要请求
+                todo = [s for s in symbols if not all(s in c for c in covered.values())]
+                skipped = len(symbols) - len(todo)
+                if skipped:
+                    logger.info(f"[{table_name}] {span} 跳过 {skipped}/{len(symbols)} 个已下载标的")
+
+                # 符号并发抓取 (信号量限流)，结果按 symbols 顺序汇总
+                results = await asyncio.gather(*[
+                    self._fetch_symbol(sem, limiter, stop_event, handler, symbol, s_str, e_str, adjust, timeout) for symbol in todo
+                ])
+                fetched = [t for t in results if t is not None]
+
+                if fetched:
+                    # 各标的已在抓取线程中转为 Arrow，合并仅追加 chunk (零拷贝)
+                    span_table = pa.concat_tables(fetched, promote_options="default")
+                    for (year, month), part in self._split_months(span_table, batch, covered, id_col):
+                        if part.num_rows == 0:
+                            continue
+                        # 月度文件整体覆盖写入，增量部分需与已有数据合并
+                        if covered[(year, month)]:
+                            existing = await asyncio.to_thread(self.storage.read_month_table, table_name, year, month)
+                            if existing is not None:
+                                part = pa.concat_tables([existing, part], promote_options="default")
+                        pending_writes.append(asyncio.create_task(
+                            self._bounded_save_month(part, table_name, year, month)
+                        ))
+
+                done_months += len(batch)
+                task.progress = round((done_months / total_months) * 100, 2)
             
+            await asyncio.gather(*pending_writes)
             task.status = TaskStatus.COMPLETED
             task.message = "分区数据下载完成"
             
@@ -176,8 +246,95 @@ class MarketDataManager:
             task.updated_at = datetime.now()
             self.stop_events.pop(task_id, None)
 
-    def _get_date_range(self, month_str: str):
-        """YYYYMM -> (s_str, e_str, year, month)"""
+    async def _fetch_symbol(self, sem: asyncio.Semaphore, limiter: Optional[AsyncRateLimiter], stop_event: asyncio.Event,
+                            handler, symbol: str, s_str: str, e_str: str, adjust: str,
+                            timeout: Optional[float] = None) -> Optional[pa.Table]:
+        """
+        单标的抓取：受信号量与数据源限速约束，失败、超时或无数据时返回 None
+        进行中的请求与 stop_event 竞速：用户停止任务后立即放弃等待 (线程中的请求自然结束，结果丢弃)
+        """
+        async with sem:
+            if limiter:
+                await limiter.acquire()
+            if stop_event.is_set():
+                return None
+            loop = asyncio.get_running_loop()
+            fetch = loop.run_in_executor(_fetch_pool, _fetch_table, handler, symbol, s_str, e_str, adjust)
+            stopped = asyncio.create_task(stop_event.wait())
+            try:
+                done, _ = await asyncio.wait({fetch, stopped}, timeout=timeout or self.FETCH_TIMEOUT,
+                                             return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                stopped.cancel()
+            if fetch not in done:
+                fetch.cancel()
+                if not stop_event.is_set():
+                    logger.error(f"标的 {symbol} 下载超时")
+                return None
+            try:
+                return fetch.result()
+            except Exception as e:
+                logger.error(f"标的 {symbol} 下载失败: {e}")
+                return None
+
+    async def _bounded_save_month(self, table: pa.Table, table_name: str, year: int, month: int):
+        """受信号量约束的月度写入"""
+        async with self.write_semaphore:
+            await self._save_month(table, table_name, year, month)
+        data_manager.invalidate_metadata()
+
+    async def _save_month(self, table: pa.Table, table_name: str, year: int, month: int):
+        """
+        月度分区写入：ZSTD 压缩为 CPU 密集型，配置进程池时在子进程中执行，避免阻塞事件循环
+        """
+        if table.num_rows == 0:
+            logger.warning(f"[{table_name}] {year}-{month} 数据为空，跳过保存")
+            return
+        if self.write_pool is None:
+            await asyncio.to_thread(self.storage.save_month_table, table=table, table_name=table_name, year=year, month=month)
+            return
+        buf = await asyncio.to_thread(to_ipc_buffer, table)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.write_pool, save_month_ipc, str(self.storage.root_dir), buf, table_name, year, month)
+
+    @classmethod
+    def _group_months(cls, months: List[str]) -> List[List[tuple]]:
+        """
+        月份去重排序后，将连续月份分组 (每组至多 MONTHS_PER_REQUEST 个)
+        返回 [[(s_str, e_str, year, month), ...], ...]
+        """
+        batches = []
+        prev = None
+        for month_str in sorted(set(months)):
+            rng = cls._get_date_range(month_str)
+            ordinal = rng[2] * 12 + rng[3]
+            if prev is None or ordinal != prev + 1 or len(batches[-1]) >= cls.MONTHS_PER_REQUEST:
+                batches.append([])
+            batches[-1].append(rng)
+            prev = ordinal
+        return batches
+
+    @staticmethod
+    def _split_months(table: pa.Table, batch: List[tuple], covered: Dict[tuple, frozenset], id_col: Optional[str]):
+        """按 trade_date 将区间结果切分为月度分片，剔除该月已落盘的标的"""
+        if len(batch) == 1:
+            # 单月请求：todo 已排除该月已覆盖的标的，无需切分
+            _, _, year, month = batch[0]
+            yield (year, month), table
+            return
+        dates = table.column("trade_date")
+        month_key = pc.add(pc.multiply(pc.year(dates), 100), pc.month(dates))
+        for _, _, year, month in batch:
+            mask = pc.equal(month_key, year * 100 + month)
+            done = covered[(year, month)]
+            if done and id_col:
+                mask = pc.and_(mask, pc.invert(pc.is_in(table.column(id_col), value_set=pa.array(list(done)))))
+            yield (year, month), table.filter(mask)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _get_date_range(month_str: str):
+        """YYYYMM -> (s_str, e_str, year, month)，纯函数，结果按月份字符串缓存"""
         if len(month_str) != 6 or not month_str.isdigit():
             raise ValueError("Format must be YYYYMM")
         year = int(month_str[:4])
@@ -186,6 +343,16 @@ class MarketDataManager:
         return f"{year}{month:02d}01", f"{year}{month:02d}{last_day}", year, month
 
 
+    def _put_task(self, task: DownloadTask):
+        self.tasks[task.task_id] = task
+        excess = len(self.tasks) - self.MAX_TASKS
+        if excess <= 0:
+            return
+        finished = [tid for tid, t in self.tasks.items()
+                    if t.status not in (TaskStatus.PENDING, TaskStatus.RUNNING)][:excess]
+        for tid in finished:
+            del self.tasks[tid]
+
     def _mark_stopped(self, task):
         task.status = TaskStatus.STOPPED
         task.message = "用户已停止"
@@ -194,6 +361,10 @@ class MarketDataManager:
     def get_task(self, task_id: str) -> Optional[DownloadTask]:
         return self.tasks.get(task_id)
 
+    def get_tasks(self, task_ids: List[str]) -> Dict[str, Optional[DownloadTask]]:
+        """批量获取任务状态，未找到的任务返回 None"""
+        return {task_id: self.tasks.get(task_id) for task_id in task_ids}
+
     def stop_task(self, task_id: str) -> bool:
         if task_id in self.stop_events:
             self.stop_events[task_id].set()
@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+import hashlib
+from collections import OrderedDict
+from datetime import date
+from typing import List, Optional
+import numpy as np
+from loguru import logger
+
+from core.config import settings
+from models.market import MarketDataContainer
+
+class QueryCache:
+    """
+    load_market_data 结果的两级缓存 (内存 LRU + 磁盘 Arrow IPC: {CACHE_DIR}/{key}.arrow)
+    磁盘层为纯数据格式 (MarketDataContainer.to_arrow_ipc)，读取时不执行任何代码，类结构调整也不影响已有文件。
+    Key 包含源表的变更指纹 (文件数, 最大 mtime_ns)，任何写入都会使旧结果自然失效。
+    同一 key 的所有调用方共享同一个 MarketDataContainer：结果只读，矩阵在入缓存时冻结 (writeable=False)，
+    需要修改时请先 copy。
+    """
+
+    # 查询窗口覆盖今天时，数据可能在盘中被刷新，额外设置 TTL 兜底
+    TODAY_TTL = 300
+    # 磁盘层上限：指纹变化后旧 key 不再命中，按条数与存活时间清理，避免缓存目录无限增长
+    MAX_DISK_ENTRIES = 256
+    DISK_MAX_AGE = 7 * 24 * 3600
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        # 扫描可在多个线程并发执行，内存层操作需加锁
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(table_names: List[str], start_date: date, end_date: date,
+                 symbols: Optional[List[str]], fingerprint: tuple) -> str:
+        raw = f"{settings.DATA_DIR}|{sorted(table_names)}|{start_date}|{end_date}|{sorted(symbols or [])}|{fingerprint}"
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    def get(self, key: str, end_date: date) -> Optional[MarketDataContainer]:
+        is_live = end_date >= date.today()
+
+        # 1. 内存层
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, container = entry
+                if not (is_live and time.time() - created_at > self.TODAY_TTL):
+                    self._memory.move_to_end(key)
+                    return container
+                del self._memory[key]
+
+        # 2. 磁盘层 (当日查询只走内存层)
+        if is_live:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            # 整体读入内存 (不使用内存映射)，清理线程删除文件时不受已返回结果的影响
+            with open(path, "rb") as f:
+                container = MarketDataContainer.from_arrow_ipc(f.read())
+            # 刷新 mtime，清理时按最近使用保留
+            os.utime(path)
+        except Exception as e:
+            logger.warning(f"查询缓存读取失败 ({path}): {e}")
+            return None
+        self._freeze(container)
+        self._remember(key, container)
+        return container
+
+    def put(self, key: str, end_date: date, container: MarketDataContainer):
+        self._freeze(container)
+        self._remember(key, container)
+        if end_date >= date.today():
+            return
+        try:
+            os.makedirs(settings.CACHE_DIR, exist_ok=True)
+            # 并发扫描可能同时写入同一 key，临时文件按线程区分
+            tmp_path = f"{self._disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(container.to_arrow_ipc())
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception as e:
+            logger.warning(f"查询缓存写入失败: {e}")
+            return
+        self._prune_disk()
+
+    def clear(self):
+        """清空内存层与磁盘层"""
+        with self._lock:
+            self._memory.clear()
+        for path in self._disk_entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _prune_disk(self):
+        """删除超过 DISK_MAX_AGE 的缓存文件，并仅保留最近使用的 MAX_DISK_ENTRIES 个"""
+        entries = []
+        for path in self._disk_entries():
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        entries.sort(reverse=True)
+        cutoff = time.time() - self.DISK_MAX_AGE
+        for idx, (mtime, path) in enumerate(entries):
+            if idx >= self.MAX_DISK_ENTRIES or mtime < cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _disk_entries(self) -> List[str]:
+        if not os.path.isdir(settings.CACHE_DIR):
+            return []
+        return [entry.path for entry in os.scandir(settings.CACHE_DIR) if entry.name.endswith(".arrow")]
+
+    @staticmethod
+    def _freeze(container: MarketDataContainer):
+        """冻结矩阵：共享的缓存结果被任一调用方原地修改时直接报错，而不是静默污染后续查询"""
+        for table in container.tables.values():
+            if isinstance(table.data, np.ndarray):
+                table.data.flags.writeable = False
+
+    def _remember(self, key: str, container: MarketDataContainer):
+        with self._lock:
+            self._memory[key] = (time.time(), container)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(settings.CACHE_DIR, f"{key}.arrow")
+
+query_cache = QueryCache()
@@ -0,0 +1,48 @@
+import asyncio
+from datetime import date
+from typing import Dict, List, Optional
+from loguru import logger
+
+from models.market import MarketDataContainer
+from services.data import data_manager
+
+class ScanHub:
+    """
+    查询合并器 (Ferris Wheel)
+    扫描进行期间到达的相同参数查询直接搭乘当前扫描，N 个并发查询只触发一次 Parquet 扫描。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    async def load_market_data(self,
+                               table_names: List[str],
+                               start_date: date,
+                               end_date: date,
+                               symbols: Optional[List[str]] = None) -> MarketDataContainer:
+        # 仅合并完全相同的查询：ffill 与标的集合均依赖查询窗口，按并集扫描后切片会改变结果
+        key = (tuple(table_names), start_date, end_date, tuple(symbols) if symbols else None)
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.get_running_loop().create_future()
+            self._inflight[key] = fut
+            asyncio.create_task(self._run_scan(key, fut))
+        else:
+            logger.debug("查询合并: {} 搭乘进行中的扫描", key[0])
+        return await asyncio.shield(fut)
+
+    async def _run_scan(self, key: tuple, fut: asyncio.Future):
+        table_names, start_date, end_date, symbols = key
+        try:
+            # DataManager 按线程分配 DuckDB 游标，不同参数的扫描可并发执行
+            result = await asyncio.to_thread(
+                data_manager.load_market_data,
+                list(table_names), start_date, end_date, list(symbols) if symbols else None
+            )
+            fut.set_result(result)
+        except Exception as e:
+            fut.set_exception(e)
+        finally:
+            self._inflight.pop(key, None)
+
+scan_hub = ScanHub()
@@ -1,18 +1,43 @@
+from typing import Optional
 import numpy as np
 
-def ffill_2d(arr: np.ndarray) -> np.ndarray:
+def ffill_2d(arr: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     纯 NumPy 实现的 2D 矩阵前值填充 (Axis 0 - 时间轴)
     要求: 仅接受 NumPy 数组，不依赖业务对象
+    out: 结果写入的数组 (可为 arr 本身，原地填充)；为空时返回新数组 (无缺失值时直接返回 arr)
     """
     mask = np.isnan(arr)
-    # 获取非 NaN 值的原始行索引
-    idx = np.where(~mask, np.arange(mask.shape[0])[:, None], 0)
+    # 仅处理含缺失值的列：多数标的每日均有数据，无需参与索引构建与 gather
+    nan_cols = np.flatnonzero(mask.any(axis=0))
+    if len(nan_cols) == 0:
+        if out is None:
+            return arr
+        if out is not arr:
+            out[...] = arr
+        return out
+    # 缺失列占多数时列子集的拷贝与回写反而更慢，退回整表 gather
+    subset = len(nan_cols) * 2 <= arr.shape[1]
+    if subset:
+        mask = mask[:, nan_cols]
+    # 获取非 NaN 值的原始行索引 (int32 索引使累积与 gather 的内存流量减半)
+    idx_dtype = np.int32 if mask.shape[0] < np.iinfo(np.int32).max else np.int64
+    idx = np.where(mask, idx_dtype(0), np.arange(mask.shape[0], dtype=idx_dtype)[:, None])
     # 沿着时间轴向下累积最大索引，实现前值位置传播
     np.maximum.accumulate(idx, axis=0, out=idx)
-    # 利用高级索引提取对应位置的值
-    col_idx = np.arange(idx.shape[1])
-    return arr[idx, col_idx]
+    # 利用高级索引提取对应位置的值 (gather 结果先于写入求值，out 为 arr 时同样安全)
+    if not subset:
+        filled = arr[idx, np.arange(idx.shape[1])]
+        if out is None:
+            return filled
+        out[...] = filled
+        return out
+    if out is None:
+        out = arr.copy()
+    elif out is not arr:
+        out[...] = arr
+    out[:, nan_cols] = arr[idx, nan_cols]
+    return out
 
 def zero_fill(arr: np.ndarray) -> np.ndarray:
     """
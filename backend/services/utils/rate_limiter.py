@@ -0,0 +1,31 @@
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """
+    异步令牌桶限流器：按总速率 (次/秒) 放行请求，允许最多 burst 个请求突发。
+    取代逐个请求后的固定 sleep：并发抓取时限制的是数据源的总请求速率，而非每个槽位的串行间隔。
+    仅在事件循环线程内使用，令牌计算与扣减之间没有 await，无需加锁。
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.burst = burst
+        # 下一个令牌可用的时间点 (monotonic)
+        self._next_free = time.monotonic()
+
+    async def acquire(self):
+        now = time.monotonic()
+        # 空闲期间累积的令牌不超过 burst 个
+        slot = max(self._next_free, now - (self.burst - 1) * self.interval)
+        self._next_free = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
@@ -0,0 +1,21 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-network", action="store_true", default=False,
+                     help="运行依赖真实行情接口的 network 测试")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "network: 依赖外部行情接口 (默认跳过，使用 --run-network 启用)")
+
+
+def pytest_collection_modifyitems(config, items):
+    # network 测试依赖外网与上游接口状态，默认跳过
+    # 启用时各下载器共用 services.downloader.session 中的线程级连接池，同一线程内的请求复用 keep-alive 连接
+    if config.getoption("--run-network"):
+        return
+    skip_network = pytest.mark.skip(reason="需要 --run-network")
+    for item in items:
+        if "network" in item.keywords:
+            item.add_marker(skip_network)
@@ -0,0 +1,8 @@
+# 测试共用常量
+
+# 日线标准字段 (不含标的列)，东财/新浪日线测试共用
+DAILY_COLUMNS = frozenset([
+    "trade_date", "open", "close", "high", "low",
+    "volume", "amount", "amplitude", "pct_change",
+    "change_amount", "turnover"
+])
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+
+from core.config import settings
+from core.storage import DuckDBStorage
+from models.market import TABLE_REGISTRY
+from services.data import data_manager
+
+TABLE = "cn_stock_em_daily_adj"
+
+def _write_month(root_dir):
+    """两个交易标的三天数据：000002 缺 01-04 整行，000001 在 01-03 的 volume 为空"""
+    fields = TABLE_REGISTRY[TABLE]["fields"]
+    rows = [
+        ("2024-01-02", "000001", 10.0, 100.0),
+        ("2024-01-02", "000002", 20.0, 200.0),
+        ("2024-01-03", "000001", 11.0, None),
+        ("2024-01-03", "000002", 21.0, 210.0),
+        ("2024-01-04", "000001", 12.0, 120.0),
+    ]
+    df = pd.DataFrame(rows, columns=["trade_date", "stock_code", "close", "volume"])
+    for f in fields:
+        if f not in df.columns:
+            df[f] = 1.25
+    DuckDBStorage(root_dir=root_dir).save_month(df, TABLE, 2024, 1)
+
+def test_matrix_track_alignment_and_cleaning(tmp_path, monkeypatch):
+    """测试矩阵轨：时间轴/标的轴对齐、缺失标的整列处理、ffill 与补零、按字段 dtype 分组。"""
+    monkeypatch.setattr(settings, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path / "cache"))
+    _write_month(settings.DATA_DIR)
+    data_manager.invalidate_metadata()
+
+    container = data_manager.load_market_data([TABLE], date(2024, 1, 1), date(2024, 1, 31),
+                                              symbols=["000002", "999999", "000001"])
+    close = container[f"{TABLE}_close"]
+    volume = container[f"{TABLE}_volume"]
+
+    # 时间轴取数据中出现的日期，标的轴为请求的全部标的 (升序)
+    assert close.timeline == ["2024-01-02", "2024-01-03", "2024-01-04"]
+    assert close.symbols == ["000001", "000002", "999999"]
+
+    # ffill：000002 缺失的 01-04 沿用 01-03；无数据的标的整列为 NaN
+    assert close.data[:, :2].tolist() == [[10.0, 20.0], [11.0, 21.0], [12.0, 21.0]]
+    assert np.isnan(close.data[:, 2]).all()
+
+    # 补零：行内空值与缺失行均为 0，无数据的标的整列为 0
+    assert volume.data.tolist() == [[100.0, 200.0, 0.0], [0.0, 210.0, 0.0], [120.0, 0.0, 0.0]]
+
+    # dtype：dtype_overrides 字段为 float32，其余 float64；同 dtype 字段共享一个连续块 (ffill 原地写回)
+    overrides = TABLE_REGISTRY[TABLE]["dtype_overrides"]
+    for f in TABLE_REGISTRY[TABLE]["fields"]:
+        expected = np.float32 if f in overrides else np.float64
+        assert container[f"{TABLE}_{f}"].data.dtype == expected, f
+    assert close.data.base is container[f"{TABLE}_open"].data.base
+    assert container[f"{TABLE}_pct_change"].data[0, 0] == np.float32(1.25)
@@ -1,5 +1,6 @@
 import asyncio
 import os
+import pytest
 import sys
 import pandas as pd
 from datetime import datetime
@@ -12,6 +13,8 @@ if BASE_DIR not in sys.path:
 from services.market_manager import market_manager
 from models.market import MarketDownloadRequest
 
+@pytest.mark.network
+@pytest.mark.asyncio
 async def test_real_download():
     """实战下行测试：验证重构后的下载系统是否真正可用"""
     # 我们测试三个典型场景
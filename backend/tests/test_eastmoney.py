@@ -3,6 +3,7 @@ from unittest.mock import patch
 
 
 from services.downloader.eastmoney import EastMoneyDownloader
+from tests.helpers import DAILY_COLUMNS
 import pandas as pd
 from loguru import logger
 
@@ -22,15 +23,10 @@ def test_fetch_sector_daily():
         assert isinstance(df, pd.DataFrame)
         assert not df.empty
         
-        expected_columns = [
-            "trade_date", "open", "close", "high", "low", 
-            "volume", "amount", "amplitude", "pct_change", 
-            "change_amount", "turnover", "sector_name"
-        ]
-        for col in expected_columns:
-            assert col in df.columns
+        missing = (DAILY_COLUMNS | {"sector_name"}) - set(df.columns)
+        assert not missing, f"missing: {missing}"
             
-        assert df['sector_name'].iloc[0] == sector_name
+        assert df.at[0, 'sector_name'] == sector_name
         
     except Exception as e:
         pytest.fail(f"fetch_sector_daily raised an exception: {e}")
@@ -50,15 +46,10 @@ def test_fetch_stock_daily():
         assert isinstance(df, pd.DataFrame)
         assert not df.empty
         
-        expected_columns = [
-            "trade_date", "open", "close", "high", "low", 
-            "volume", "amount", "amplitude", "pct_change", 
-            "change_amount", "turnover", "stock_code"
-        ]
-        for col in expected_columns:
-            assert col in df.columns
+        missing = (DAILY_COLUMNS | {"stock_code"}) - set(df.columns)
+        assert not missing, f"missing: {missing}"
             
-        assert df['stock_code'].iloc[0] == symbol
+        assert df.at[0, 'stock_code'] == symbol
         
     except Exception as e:
         pytest.fail(f"fetch_stock_daily raised an exception: {e}")
@@ -78,38 +69,23 @@ def test_get_all_symbols():
         pytest.fail(f"get_all_symbols raised an exception: {e}")
 
 @pytest.mark.network
-def test_fetch_stock_info():
-    """测试获取股票基础信息 (快照)"""
+@pytest.mark.parametrize("method_name, id_col, name_col", [
+    ("fetch_stock_info", "stock_code", "stock_name"),        # A 股基础信息快照
+    ("fetch_sector_info", "sector_name", "sector_name"),     # 行业板块基础信息
+    ("fetch_concept_info", "concept_name", "concept_name"),  # 概念板块基础信息
+])
+def test_fetch_info_snapshot(method_name, id_col, name_col):
+    """测试基础信息快照：非空、包含主键列与名称列，且不含任何行情字段 (纯净化)"""
     downloader = EastMoneyDownloader()
-    df = downloader.fetch_stock_info()
+    df = getattr(downloader, method_name)()
     assert isinstance(df, pd.DataFrame)
     assert not df.empty
-    assert "stock_code" in df.columns
-    assert "stock_name" in df.columns
-    # 验证纯净化：不应包含行情字段
+    assert id_col in df.columns
+    assert name_col in df.columns
     forbidden = ["open", "close", "high", "low", "volume", "amount"]
     for col in forbidden:
         assert col not in df.columns
 
-@pytest.mark.network
-def test_fetch_sector_info():
-    """测试获取行业板块基础信息"""
-    downloader = EastMoneyDownloader()
-    df = downloader.fetch_sector_info()
-    assert isinstance(df, pd.DataFrame)
-    assert not df.empty
-    assert "sector_name" in df.columns
-    assert "open" not in df.columns # 验证纯净化
-
-@pytest.mark.network
-def test_fetch_concept_info():
-    """测试获取概念板块基础信息"""
-    downloader = EastMoneyDownloader()
-    df = downloader.fetch_concept_info()
-    assert isinstance(df, pd.DataFrame)
-    assert not df.empty
-    assert "concept_name" in df.columns
-
 @pytest.mark.network
 def test_fetch_stock_sector_map():
     """测试获取股票-行业映射 (Mock 限制板块数量以节省时间)"""
@@ -127,6 +103,41 @@ def test_fetch_stock_sector_map():
         assert "sector_name" in df.columns
         
         # 验证结果中包含我们指定的板块
-        unique_sectors = df['sector_name'].unique().tolist()
-        for s in test_sectors:
-            assert s in unique_sectors
+        missing = set(test_sectors) - set(df['sector_name'].unique())
+        assert not missing, f"missing sectors: {missing}"
+
+@pytest.mark.asyncio
+async def test_fetch_stock_sector_map_concurrent_isolation():
+    """测试板块成员并发抓取：保持板块顺序，单个板块失败被隔离"""
+    downloader = EastMoneyDownloader()
+
+    def fake_cons(symbol):
+        if symbol == "坏板块":
+            raise ConnectionError("boom")
+        return pd.DataFrame({"代码": ["000001"], "名称": ["平安银行"], "最新价": [10.0]})
+
+    progress = []
+    with patch.object(EastMoneyDownloader, 'get_all_sectors', return_value=["银行", "坏板块", "保险"]), \
+         patch("services.downloader.eastmoney.ak.stock_board_industry_cons_em", side_effect=fake_cons):
+        df = await downloader.fetch_stock_sector_map(progress_callback=lambda p, msg: progress.append(p))
+
+    assert df["sector_name"].tolist() == ["银行", "保险"]
+    assert list(df.columns) == ["stock_code", "stock_name", "sector_name"]
+    assert sorted(progress)[-1] == 100.0
+
+def test_pooled_session_applies_http_timeout():
+    """测试池化 Session：仅替换 akshare 模块内的 requests，timeout=None 时补上单次请求超时，显式超时保持不变"""
+    import requests
+    import akshare.stock_feature.stock_hist_em as hist_em
+    from services.downloader.session import HTTP_TIMEOUT, get_session, install_pooled_session
+    global_get = requests.get
+    install_pooled_session()
+    assert hist_em.requests is not requests
+    assert requests.get is global_get
+    assert hist_em.requests.exceptions is requests.exceptions
+
+    with patch.object(type(get_session()), "get") as fake_get:
+        hist_em.requests.get("http://example.invalid", timeout=None)
+        hist_em.requests.get("http://example.invalid", timeout=3)
+
+    assert [c.kwargs["timeout"] for c in fake_get.call_args_list] == [HTTP_TIMEOUT, 3]
@@ -7,7 +7,9 @@ from models.market import MarketDownloadRequest
 @pytest.fixture
 def manager():
     with patch('services.market_manager.DuckDBStorage'):
-        return MarketDataManager()
+        manager = MarketDataManager()
+    manager.storage.get_symbol_month_coverage.return_value = {}
+    return manager
 
 @pytest.mark.asyncio
 async def test_auto_scheduling_symbols(manager):
@@ -34,3 +36,122 @@ async def test_invalid_table(manager):
     request = MarketDownloadRequest(table_name="invalid_table")
     with pytest.raises(ValueError, match="不受支持的表名"):
         await manager.start_market_download_task(request)
+
+def test_invalid_months_format():
+    """测试 months 格式在请求模型层即被拒绝。"""
+    from pydantic import ValidationError
+    with pytest.raises(ValidationError):
+        MarketDownloadRequest(table_name="cn_stock_em_daily_adj", months=["2025-01"])
+
+def test_get_tasks_batch(manager):
+    """测试批量任务状态查询。"""
+    from models.task import DownloadTask, TaskStatus
+    manager.tasks["t1"] = DownloadTask(task_id="t1", status=TaskStatus.RUNNING)
+
+    result = manager.get_tasks(["t1", "missing"])
+
+    assert result["t1"].status == TaskStatus.RUNNING
+    assert result["missing"] is None
+
+@pytest.mark.asyncio
+async def test_partition_download_writes_all_months(manager):
+    """测试连续月份合并为一次区间请求，按 trade_date 切分后各月均落盘，已下载的 (月份, 标的) 被剔除。"""
+    import pandas as pd
+    from models.task import DownloadTask, TaskStatus
+    calls = []
+    def fetch(symbol, s_str, e_str, adjust):
+        calls.append((symbol, s_str, e_str))
+        return pd.DataFrame({"stock_code": [symbol] * 3,
+                             "trade_date": pd.to_datetime(["2025-01-02", "2025-02-03", "2025-03-03"])})
+    mock_dl = MagicMock()
+    mock_dl.fetch.side_effect = fetch
+    manager.storage.get_symbol_month_coverage.return_value = {(2025, 2): frozenset(["000002"])}
+    manager.storage.read_month_table.return_value = None
+    manager.tasks["t1"] = DownloadTask(task_id="t1", status=TaskStatus.PENDING)
+    manager.stop_events["t1"] = asyncio.Event()
+
+    saved = {}
+    async def fake_save(table, table_name, year, month):
+        await asyncio.sleep(0)
+        saved[(year, month)] = table.column("stock_code").to_pylist()
+
+    with patch.object(manager, '_save_month', side_effect=fake_save):
+        await manager._run_partition_download(
+            "t1", mock_dl, ["000001", "000002"], "cn_stock_em_daily_adj", {"handler": "fetch"}, ["202503", "202501", "202502"]
+        )
+
+    assert manager.tasks["t1"].status == TaskStatus.COMPLETED
+    assert sorted(calls) == [("000001", "20250101", "20250331"), ("000002", "20250101", "20250331")]
+    manager.storage.get_symbol_month_coverage.assert_called_once_with(
+        "cn_stock_em_daily_adj", "stock_code", [(2025, 1), (2025, 2), (2025, 3)])
+    assert saved == {(2025, 1): ["000001", "000002"], (2025, 2): ["000001"], (2025, 3): ["000001", "000002"]}
+
+@pytest.mark.asyncio
+async def test_partition_download_fetches_symbols_concurrently(manager):
+    """测试单月标的并发抓取：并发数受 concurrency 限制，结果按 symbols 顺序合并，失败标的被隔离。"""
+    import threading
+    import time
+    import pandas as pd
+    from models.task import DownloadTask, TaskStatus
+    active, peak = 0, 0
+    lock = threading.Lock()
+
+    def fetch(symbol, s_str, e_str, adjust):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+        if symbol == "bad":
+            raise ConnectionError("boom")
+        return pd.DataFrame({"stock_code": [symbol]})
+
+    mock_dl = MagicMock()
+    mock_dl.fetch.side_effect = fetch
+    manager.tasks["t1"] = DownloadTask(task_id="t1", status=TaskStatus.PENDING)
+    manager.stop_events["t1"] = asyncio.Event()
+
+    saved = []
+    async def fake_save(table, table_name, year, month):
+        saved.append(table.column("stock_code").to_pylist())
+
+    symbols = ["000001", "bad", "000002", "000003", "000004"]
+    with patch.object(manager, '_save_month', side_effect=fake_save):
+        await manager._run_partition_download(
+            "t1", mock_dl, symbols, "cn_stock_em_daily_adj", {"handler": "fetch", "concurrency": 2}, ["202501"]
+        )
+
+    assert manager.tasks["t1"].status == TaskStatus.COMPLETED
+    assert saved == [["000001", "000002", "000003", "000004"]]
+    assert peak == 2
+
+def test_task_store_evicts_oldest_finished(manager):
+    """测试任务状态上限：超出时淘汰最早的已结束任务，运行中的任务保留。"""
+    from models.task import DownloadTask, TaskStatus
+    manager.MAX_TASKS = 2
+    manager._put_task(DownloadTask(task_id="running", status=TaskStatus.RUNNING))
+    manager._put_task(DownloadTask(task_id="done1", status=TaskStatus.COMPLETED))
+    manager._put_task(DownloadTask(task_id="done2", status=TaskStatus.FAILED))
+
+    assert list(manager.tasks) == ["running", "done2"]
+
+@pytest.mark.asyncio
+async def test_fetch_symbol_honors_stop_and_timeout(manager):
+    """测试进行中的抓取：停止信号或超时到达时立即返回 None，不等待阻塞请求结束。"""
+    import threading
+    import time
+    release = threading.Event()
+
+    def slow_fetch(symbol, s_str, e_str, adjust):
+        release.wait(5)
+
+    sem = asyncio.Semaphore(1)
+    stop_event = asyncio.Event()
+    asyncio.get_running_loop().call_later(0.05, stop_event.set)
+    started = time.monotonic()
+    assert await manager._fetch_symbol(sem, None, stop_event, slow_fetch, "000001", "", "", "") is None
+    assert await manager._fetch_symbol(sem, None, asyncio.Event(), slow_fetch, "000001", "", "", "", timeout=0.05) is None
+    assert time.monotonic() - started < 2
+    release.set()
@@ -0,0 +1,24 @@
+import ast
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+@pytest.mark.parametrize("rel_path,name", [
+    ("core/storage.py", "DuckDBStorage"),
+    ("models/market.py", "TableData"),
+    ("models/market.py", "MarketDataContainer"),
+    ("services/market_manager.py", "MarketDataManager"),
+    ("api/main.py", "api_router"),
+])
+def test_single_definition(rel_path, name):
+    """防止合并冲突导致同一模块内重复定义类或路由对象。"""
+    tree = ast.parse((BACKEND_DIR / rel_path).read_text(encoding="utf-8"))
+    count = 0
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == name:
+            count += 1
+        elif isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == name for t in node.targets):
+            count += 1
+    assert count == 1
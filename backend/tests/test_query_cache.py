@@ -0,0 +1,74 @@
+import os
+import time
+from datetime import date
+from core.config import settings
+from models.market import MarketDataContainer, TableData
+from services.query_cache import QueryCache
+
+def _container():
+    return MarketDataContainer({"t": TableData(name="t", data=[{"k": "v"}])})
+
+def test_query_cache_memory_and_disk(tmp_path, monkeypatch):
+    """测试两级缓存：内存命中、淘汰后从磁盘恢复、指纹变化后失效。"""
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+    cache = QueryCache(maxsize=1)
+    end = date(2024, 1, 31)
+    key = cache.make_key(["t"], date(2024, 1, 1), end, None, ((1, 100),))
+
+    container = _container()
+    cache.put(key, end, container)
+    assert cache.get(key, end) is container
+
+    # 内存层容量为 1，写入新 key 后旧结果只能从磁盘恢复
+    other_key = cache.make_key(["t"], date(2024, 2, 1), end, None, ((1, 100),))
+    cache.put(other_key, end, _container())
+    restored = cache.get(key, end)
+    assert restored is not None and restored is not container
+    assert restored["t"].to_dict()["data"] == [{"k": "v"}]
+
+    new_key = cache.make_key(["t"], date(2024, 1, 1), end, None, ((1, 200),))
+    assert cache.get(new_key, end) is None
+
+    # clear 同时清空磁盘层
+    cache.clear()
+    assert list(tmp_path.glob("*.arrow")) == []
+    assert cache.get(key, end) is None
+
+def test_query_cache_prunes_disk_and_freezes(tmp_path, monkeypatch):
+    """测试磁盘层按条数清理 (保留最近写入)，缓存的矩阵只读。"""
+    import numpy as np
+    import pytest
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+    cache = QueryCache()
+    cache.MAX_DISK_ENTRIES = 2
+    end = date(2024, 1, 31)
+    keys = [cache.make_key(["t"], date(2024, 1, 1), end, None, ((1, i),)) for i in range(3)]
+    now = time.time()
+    for i, key in enumerate(keys):
+        cache.put(key, end, _container())
+        os.utime(cache._disk_path(key), (now - 100 + i, now - 100 + i))
+    cache.put(keys[2], end, _container())
+
+    assert sorted(p.stem for p in tmp_path.glob("*.arrow")) == sorted(keys[1:])
+
+    matrix = MarketDataContainer({"m": TableData(name="m", timeline=["2024-01-01"], symbols=["000001"],
+                                                 data=np.array([[1.0]]))})
+    cache.put(keys[0], end, matrix)
+    with pytest.raises(ValueError):
+        cache.get(keys[0], end)["m"].data[0, 0] = 2.0
+
+    # 新实例 (空内存层) 从磁盘 Arrow IPC 还原矩阵，同样只读
+    restored = QueryCache().get(keys[0], end)["m"]
+    assert restored.data.tolist() == [[1.0]] and restored.symbols == ["000001"]
+    assert not restored.data.flags.writeable
+
+def test_query_cache_live_query_skips_disk(tmp_path, monkeypatch):
+    """测试覆盖今天的查询只进入内存层。"""
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path))
+    cache = QueryCache()
+    today = date.today()
+    key = cache.make_key(["t"], today, today, None, ())
+
+    cache.put(key, today, _container())
+    assert list(tmp_path.iterdir()) == []
+    assert cache.get(key, today) is not None
@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+from datetime import date
+from unittest.mock import patch
+
+from services.scan_hub import ScanHub
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_queries_share_scan():
+    """测试并发的相同查询只触发一次扫描。"""
+    hub = ScanHub()
+    calls = []
+
+    def fake_load(table_names, start_date, end_date, symbols):
+        calls.append(table_names)
+        return {"tables": table_names}
+
+    with patch("services.scan_hub.data_manager.load_market_data", side_effect=fake_load):
+        args = (["cn_stock_em_daily_adj"], date(2024, 1, 1), date(2024, 1, 31))
+        results = await asyncio.gather(*[hub.load_market_data(*args) for _ in range(5)])
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert not hub._inflight
+
+@pytest.mark.asyncio
+async def test_scan_error_propagates_to_all_waiters():
+    """测试扫描异常传递给所有等待者。"""
+    hub = ScanHub()
+    with patch("services.scan_hub.data_manager.load_market_data", side_effect=ValueError("boom")):
+        args = (["t"], date(2024, 1, 1), date(2024, 1, 31))
+        results = await asyncio.gather(*[hub.load_market_data(*args) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
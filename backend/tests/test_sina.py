@@ -1,6 +1,7 @@
 import pytest
 import pandas as pd
 from services.downloader.sina import SinaDownloader
+from tests.helpers import DAILY_COLUMNS
 
 @pytest.mark.network
 def test_sina_fetch_stock_daily():
@@ -16,15 +17,10 @@ def test_sina_fetch_stock_daily():
         assert isinstance(df, pd.DataFrame)
         assert not df.empty
         
-        expected_columns = [
-            "trade_date", "open", "close", "high", "low", 
-            "volume", "amount", "amplitude", "pct_change", 
-            "change_amount", "turnover", "stock_code"
-        ]
-        for col in expected_columns:
-            assert col in df.columns
+        missing = (DAILY_COLUMNS | {"stock_code"}) - set(df.columns)
+        assert not missing, f"missing: {missing}"
             
-        assert df['stock_code'].iloc[0] == symbol
+        assert df.at[0, 'stock_code'] == symbol
     except Exception as e:
         pytest.fail(f"Sina fetch_stock_daily failed: {e}")
 
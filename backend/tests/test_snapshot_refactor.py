@@ -18,7 +18,7 @@ def test_table_data_methods():
     td = TableData(name="test_1to1", data=data_1to1)
     
     assert td.get_value("000001") == "平安银行"
-    assert td.get_value("000003", "未知") == "未知"
+    assert td.get_value("000003", default="未知") == "未知"
     assert td.get_list("000001") == ["平安银行"]
     assert td.get_list("000003") == []
     
@@ -30,6 +30,75 @@ def test_table_data_methods():
     assert td_m.get_list("板块C") == []
     print("TableData methods test passed!")
 
+def test_table_data_matrix_lookup():
+    import numpy as np
+    td = TableData(name="m", timeline=["2024-01-01", "2024-01-03"], symbols=["000001", "000002"],
+                   data=np.array([[1.0, 2.0], [3.0, 4.0]]))
+
+    assert td["2024-01-03", "000002"] == 4.0
+    assert np.isnan(td["2024-01-02", "000001"])
+    assert np.isnan(td["2024-01-01", "999999"])
+
+    out = td.get_many(["2024-01-01", "2024-01-03", "2024-01-02"], ["000002", "000001", "000001"])
+    assert out[:2].tolist() == [2.0, 3.0]
+    assert np.isnan(out[2])
+
+    tbl = td.to_arrow()
+    assert tbl.column_names == ["t", "000001", "000002"]
+    assert tbl.column("000002").to_pylist() == [2.0, 4.0]
+    assert td.as_numpy() is td.data
+
+def test_table_data_float32_json():
+    import numpy as np
+
+    class AstypeSpy(np.ndarray):
+        """记录 astype 目标类型，确认序列化不经过逐元素字符串转换"""
+        calls = []
+        def astype(self, dtype, *args, **kwargs):
+            AstypeSpy.calls.append(np.dtype(dtype))
+            return np.asarray(self).astype(dtype, *args, **kwargs)
+
+    raw = np.array([[1.23, -0.07, np.nan], [1234.56, 0.0, 3e-5]], dtype=np.float32)
+    td = TableData(name="m", timeline=["2024-01-01", "2024-01-02"], symbols=["000001", "000002", "000003"],
+                   data=raw.view(AstypeSpy))
+
+    data = td.to_dict()["data"]
+    assert data[0][:2] == [1.23, -0.07] and np.isnan(data[0][2])
+    assert data[1] == [1234.56, 0.0, 3e-5]
+    assert AstypeSpy.calls and all(dt.kind == "f" for dt in AstypeSpy.calls)
+    assert TableData(name="m", timeline=["2024-01-01"], symbols=["000001"],
+                     data=raw[:1, :1]).to_arrow().column("000001").type == "float"
+
+def test_table_data_arrow_mapping():
+    import pyarrow as pa
+    tbl = pa.table({"stock_code": ["000001", "000002", "000001"], "sector_name": ["银行", "地产", "金融"]})
+    td = TableData(name="s", symbols=tbl.column("stock_code").to_pylist(), data=tbl)
+
+    assert td.get_value("000002", target="sector_name") == "地产"
+    assert td.get_value("999999", target="sector_name", default="未知") == "未知"
+    assert td.get_list("000001", by="stock_code", target="sector_name") == ["银行", "金融"]
+    assert td.get_list(1, by="stock_code", target="sector_name") == []
+    assert td.to_dict()["data"][0] == {"stock_code": "000001", "sector_name": "银行"}
+    assert td.to_arrow().schema.metadata[b"name"] == b"s"
+
+def test_container_arrow_ipc_roundtrip():
+    import numpy as np
+    import pyarrow as pa
+    from models.market import MarketDataContainer
+    container = MarketDataContainer({
+        "m": TableData(name="m", timeline=["2024-01-01"], symbols=["000001"], data=np.array([[1.5]])),
+        "s": TableData(name="s", symbols=["000001"], data=[{"stock_code": "000001", "stock_name": "平安银行"}]),
+    })
+
+    reader = pa.BufferReader(container.to_arrow_ipc())
+    tables = []
+    while reader.tell() < reader.size():
+        tables.append(pa.ipc.open_stream(reader).read_all())
+
+    assert [t.schema.metadata[b"name"] for t in tables] == [b"m", b"s"]
+    assert tables[0].column("000001").to_pylist() == [1.5]
+    assert tables[1].column("stock_name").to_pylist() == ["平安银行"]
+
 def test_registry_config():
     print("Testing TABLE_REGISTRY config...")
     assert "cn_stock_em" in TABLE_REGISTRY
@@ -37,23 +106,24 @@ def test_registry_config():
     assert TABLE_REGISTRY["cn_stock_em_daily_adj"]["storage_type"] == "partition"
     print("TABLE_REGISTRY config test passed!")
 
-def test_metadata_audit_o1():
+def test_metadata_audit_o1(tmp_path):
     print("Testing O(1) metadata audit...")
-    # 模拟环境：创建一个虚拟的快照 Parquet 文件（无 trade_date 列）
-    data_dir = "backend/tests/mock_data"
-    os.makedirs(os.path.join(data_dir, "cn_stock_em"), exist_ok=True)
-    parquet_path = os.path.join(data_dir, "cn_stock_em", "cn_stock_em.parquet")
+    # 模拟环境：在临时目录创建一个虚拟的快照 Parquet 文件（无 trade_date 列），由 pytest 负责清理
+    data_dir = tmp_path / "mock_data"
+    os.makedirs(data_dir / "cn_stock_em", exist_ok=True)
+    parquet_path = data_dir / "cn_stock_em" / "cn_stock_em.parquet"
     
     df = pd.DataFrame({
         "stock_code": ["000001", "000002"],
         "stock_name": ["平安银行", "万科A"]
     })
-    df.to_parquet(parquet_path)
+    # 一次性夹具，无需压缩
+    df.to_parquet(parquet_path, compression=None)
     
     # 临时修改 settings.DATA_DIR
     from core.config import settings
     old_data_dir = settings.DATA_DIR
-    settings.DATA_DIR = os.path.abspath(data_dir)
+    settings.DATA_DIR = str(data_dir)
     
     try:
         data_manager.initialize()
@@ -68,15 +138,15 @@ def test_metadata_audit_o1():
         print("Metadata audit test passed!")
     finally:
         settings.DATA_DIR = old_data_dir
-        # 清理
-        import shutil
-        shutil.rmtree(data_dir)
 
 if __name__ == "__main__":
     try:
         test_table_data_methods()
         test_registry_config()
-        test_metadata_audit_o1()
+        import tempfile
+        from pathlib import Path
+        with tempfile.TemporaryDirectory() as tmp:
+            test_metadata_audit_o1(Path(tmp))
         print("\nAll tests passed successfully!")
     except Exception as e:
         print(f"\nTest failed: {e}")
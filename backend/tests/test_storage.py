@@ -63,3 +63,39 @@ def test_save_month(temp_storage_dir):
     assert read_df.iloc[0]["sector_name"] == "Semicon"
     
     # Clean up is handled by pytest tmp_path fixture automatically
+
+def test_save_month_ipc_roundtrip(temp_storage_dir):
+    """Test the process-pool entry point writes the same partition as save_month."""
+    from core.storage import to_ipc_buffer, save_month_ipc
+
+    df = pd.DataFrame({
+        "trade_date": ["2024-02-02", "2024-02-01"],
+        "stock_code": ["000001", "000001"],
+        "close": [11.0, 10.0],
+    })
+    save_month_ipc(temp_storage_dir, to_ipc_buffer(df), "cn_stock_em_daily_raw", 2024, 2)
+
+    expected_path = Path(temp_storage_dir) / "cn_stock_em_daily_raw" / "year=2024" / "2024-02.parquet"
+    read_df = duckdb.sql(f"SELECT * FROM '{str(expected_path)}'").df()
+    assert read_df["close"].tolist() == [10.0, 11.0]
+
+def test_symbol_month_coverage(temp_storage_dir):
+    """Only partitions written after their month ended count as downloaded."""
+    import time
+    storage = DuckDBStorage(root_dir=temp_storage_dir)
+    df = pd.DataFrame({
+        "trade_date": ["2024-02-01", "2024-02-01"],
+        "stock_code": ["000001", "000002"],
+        "close": [10.0, 20.0],
+    })
+    storage.save_month(df, "cn_stock_em_daily_raw", 2024, 2)
+    storage.save_month(df, "cn_stock_em_daily_raw", 2024, 3)
+    # 模拟 3 月数据在月中写入
+    mid_month = time.mktime((2024, 3, 15, 12, 0, 0, 0, 0, -1))
+    os.utime(storage.month_path("cn_stock_em_daily_raw", 2024, 3), (mid_month, mid_month))
+
+    coverage = storage.get_symbol_month_coverage("cn_stock_em_daily_raw", "stock_code", [(2024, 2), (2024, 3), (2024, 4)])
+
+    assert coverage == {(2024, 2): frozenset({"000001", "000002"})}
+    # 仅检查请求的月份
+    assert storage.get_symbol_month_coverage("cn_stock_em_daily_raw", "stock_code", [(2024, 3)]) == {}
@@ -4,12 +4,15 @@ import shutil
 import glob
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import datetime
 from loguru import logger
 
 # Add backend to path
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
+from core.storage import PARQUET_WRITE_OPTIONS
 from services.data import data_manager
 import services.data
 from models.market import MarketDataContainer, TableData, TABLE_REGISTRY
@@ -32,28 +35,27 @@ def setup_dummy_data(test_dir):
     dates = pd.date_range(start="2024-01-01", end="2024-01-05") # 5 days
     symbols = ["000001", "000002"]
 
-    data = []
-    for d in dates:
-        for s in symbols:
-            # Simulate missing data for alignment check
-            if s == "000002" and d == dates[-1]:
-                continue # Skip last day for 000002
-                
-            data.append({
-                "trade_date": d.strftime("%Y-%m-%d"),
-                "stock_code": s,
-                "open": float(np.random.rand()),
-                "close": float(np.random.rand()),
-                "high": float(np.random.rand()),
-                "low": float(np.random.rand()),
-                "volume": int(np.random.randint(100, 1000)),
-                "amount": float(np.random.rand() * 1000),
-                "pct_change": float(np.random.rand()),
-                "turnover": float(np.random.rand())
-            })
-            
-    df = pd.DataFrame(data)
-    df.to_parquet(os.path.join(year_dir, "data.parquet"))
+    # 按列整体生成 (笛卡尔积: 日期 x 标的)，每列一次随机数调用
+    # 字段取自 TABLE_REGISTRY，保证覆盖加载器 SELECT 的全部列
+    config = TABLE_REGISTRY[table_name]
+    idx = pd.MultiIndex.from_product([dates, symbols], names=["trade_date", config["id_col"]])
+    n = len(idx)
+    columns = {
+        "trade_date": idx.get_level_values(0).strftime("%Y-%m-%d"),
+        config["id_col"]: idx.get_level_values(1),
+    }
+    for field in config["fields"]:
+        if field == "volume":
+            columns[field] = np.random.randint(100, 1000, size=n)
+        elif field == "amount":
+            columns[field] = np.random.rand(n) * 1000
+        else:
+            columns[field] = np.random.rand(n)
+    df = pd.DataFrame(columns)
+    # Simulate missing data for alignment check: skip last day for 000002
+    df = df[~((df["stock_code"] == "000002") & (df["trade_date"] == dates[-1].strftime("%Y-%m-%d")))].reset_index(drop=True)
+    # 与正式写入一致的 Parquet 参数 (ZSTD + 字典编码 + 列统计)，加载时 DuckDB 可按列投影与统计裁剪
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), os.path.join(year_dir, "data.parquet"), **PARQUET_WRITE_OPTIONS)
     logger.info(f"Created dummy data at {year_dir}")
     return df
 
@@ -2,11 +2,14 @@ import requests
 import json
 
 url = "http://localhost:8000/api/v1/market/tasks/download"
-payload = {"table_name": "cn_stock_em"}
+payloads = [{"table_name": "cn_stock_em"}]
 
-try:
-    response = requests.post(url, json=payload)
-    print(f"Status: {response.status_code}")
-    print(response.json())
-except Exception as e:
-    print(f"Error: {e}")
+# 复用同一 Session (keep-alive)，触发多张表时不再逐次重建连接
+with requests.Session() as session:
+    for payload in payloads:
+        try:
+            response = session.post(url, json=payload)
+            print(f"Status: {response.status_code}")
+            print(response.json())
+        except Exception as e:
+            print(f"Error: {e}")
@@ -1,23 +1,29 @@
 import asyncio
 import sys
-from pathlib import Path
 
 from services.market_manager import market_manager
 from models.market import MarketDownloadRequest, MarketTable
 from models.task import TaskStatus
-from core.config import settings
+from services.downloader.session import install_pooled_session
 
 async def run_verify_task(req: MarketDownloadRequest):
-    print(f"\n[Testing] Source: {req.source}, Type: {req.data_type}, Symbols: {req.symbols}")
+    print(f"\n[Testing] Table: {req.table_name}, Symbols: {req.symbols}, Months: {req.months}")
     task_id = await market_manager.start_market_download_task(req)
     
+    # 轮询间隔自适应退避 (0.1s 起步，上限 2s)：短任务结束后立即返回，长任务不频繁唤醒
+    backoff = 0.1
+    last_state = None
     while True:
         task = market_manager.get_task(task_id)
         if not task: break
-        print(f"Status: {task.status}, Progress: {task.progress}%, Msg: {task.message}")
+        state = (task.status, task.progress, task.message)
+        if state != last_state:
+            print(f"Status: {task.status}, Progress: {task.progress}%, Msg: {task.message}")
+            last_state = state
         if task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.STOPPED]:
             break
-        await asyncio.sleep(2)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 1.5, 2.0)
         
     if task.status == TaskStatus.COMPLETED:
         print("Task Completed Successfully.")
@@ -26,16 +32,16 @@ async def run_verify_task(req: MarketDownloadRequest):
         year = int(month_str[:4])
         month = int(month_str[4:])
         
-        table_name = market_manager._route_table_name(req)
-        parquet_path = Path(settings.DATA_DIR) / f"{table_name}/year={year}/{year}-{month:02d}.parquet"
+        parquet_path = market_manager.storage.month_path(req.table_name, year, month)
         
         if parquet_path.exists():
-            import duckdb
-            conn = duckdb.connect()
-            df = conn.execute(f"SELECT * FROM '{parquet_path}' LIMIT 5").df()
+            import pyarrow.parquet as pq
+            # 预览仅需少数列的前 5 行：按列投影读取首个批次，不解码其余列与行组
+            pf = pq.ParquetFile(parquet_path)
+            preview_cols = [c for c in ("trade_date", "stock_code", "sector_name", "close") if c in pf.schema_arrow.names]
+            batch = next(pf.iter_batches(batch_size=5, columns=preview_cols), None)
             print(f"Verified {parquet_path}:")
-            print(df.head())
-            conn.close()
+            print(batch.to_pandas() if batch is not None else "(empty)")
         else:
             print(f"Error: Parquet file missing at {parquet_path}")
     else:
@@ -43,21 +49,24 @@ async def run_verify_task(req: MarketDownloadRequest):
 
 async def main():
     print("=== CarrotQuant Professional Refactoring Verification ===")
+    # 与应用启动时一致：akshare 请求走线程级连接池
+    install_pooled_session()
     
-    # 1. EM Sector Raw
-    await run_verify_task(MarketDownloadRequest(
-        source="em", data_type="sector", symbols=["半导体"], months=["202401"], adjust="raw"
-    ))
-    
-    # 2. EM Stock Adj (Professional Standard)
-    await run_verify_task(MarketDownloadRequest(
-        source="em", data_type="stock", symbols=["000001"], months=["202402"], adjust="adj"
-    ))
-    
-    # 3. Sina Stock Adj
-    await run_verify_task(MarketDownloadRequest(
-        source="sina", data_type="stock", symbols=["600519"], months=["202403"], adjust="adj"
-    ))
+    # 1-3. 三个任务的数据源、月份与落盘路径互不相关，并发执行 (任务 ID 唯一，状态轮询互不干扰)
+    await asyncio.gather(
+        # 1. EM Sector Raw
+        run_verify_task(MarketDownloadRequest(
+            table_name=MarketTable.CN_SECTOR_EM_DAILY_RAW, symbols=["半导体"], months=["202401"]
+        )),
+        # 2. EM Stock Adj (Professional Standard)
+        run_verify_task(MarketDownloadRequest(
+            table_name=MarketTable.CN_STOCK_EM_DAILY_ADJ, symbols=["000001"], months=["202402"]
+        )),
+        # 3. Sina Stock Adj
+        run_verify_task(MarketDownloadRequest(
+            table_name=MarketTable.CN_STOCK_SINA_DAILY_ADJ, symbols=["600519"], months=["202403"]
+        )),
+    )
 
     # 4. Test Auto-scheduling (just symbol list fetch)
     print("\n[Testing] Auto-fetching (Sample Top 10) symbols for EM...")